@@ -24,7 +24,7 @@ RO_CRATE_METADATA_FILE = 'ro-crate-metadata.json'
 `rocrate <https://www.researchobject.org/ro-crate>`__ metadata JSON file name
 """
 
-PROVENANCE_ERRORS_FILE = 'provenance_errors.json'
+PROVENANCE_ERRORS_FILE = 'provenance_errors.jsonl'
 """
 Contains log of any failed fairscape-cli calls
 """
@@ -4,6 +4,11 @@ import os
 import ndex2
 from ndex2.cx2 import CX2Network, RawCX2NetworkFactory
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 def get_host_and_uuid_from_network_url(network_url):
     if network_url is None:
@@ -16,6 +21,8 @@ def get_host_and_uuid_from_network_url(network_url):
 def get_interactome(host, uuid, username, password, parent_edgelist):
     """
     Retrieves the interactome either from NDEx or from a local edge list.
+    If `orjson <https://github.com/ijl/orjson>`__ is installed it is
+    used to parse the network retrieved from NDEx
 
     :return: A CX2Network object representing the interactome.
     :rtype: CX2Network
@@ -36,7 +43,10 @@ def get_interactome(host, uuid, username, password, parent_edgelist):
         client = ndex2.client.Ndex2(host=host, username=username, password=password)
         factory = RawCX2NetworkFactory()
         client_resp = client.get_network_as_cx2_stream(uuid)
-        interactome = factory.get_cx2network(json.loads(client_resp.content))
+        if orjson is not None:
+            interactome = factory.get_cx2network(orjson.loads(client_resp.content))
+        else:
+            interactome = factory.get_cx2network(json.loads(client_resp.content))
     return interactome
 
 
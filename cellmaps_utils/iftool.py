@@ -1,5 +1,4 @@
 import os
-import re
 import shutil
 import uuid
 from datetime import date
@@ -72,6 +71,19 @@ def download_file(downloadtuple):
         return -5, str(e), downloadtuple
 
 
+def _get_color_from_filename(fname):
+    """
+    Gets color from image file name which is the text after
+    the last ``_`` and before the first ``.`` that follows it
+
+    :param fname: image file name ie ``1_A1_1_blue.jpg``
+    :type fname: str
+    :return: color ie ``blue``
+    :rtype: str
+    """
+    return fname.rpartition('_')[2].partition('.')[0]
+
+
 class ImageDownloader(object):
     """
     Abstract class that defines interface for classes that download images
@@ -138,13 +150,13 @@ class FakeImageDownloader(ImageDownloader):
                 raise CellMapsError('Unable to download ' +
                                     str(entry))
             fname = os.path.basename(entry[1])
-            color = re.sub('\..*$', '', re.sub('^.*_', '', fname))
+            color = _get_color_from_filename(fname)
             src_image_dict[color] = entry[1]
 
         for entry in download_list[5:]:
             t.update()
             fname = os.path.basename(entry[1])
-            color = re.sub('\..*$', '', re.sub('^.*_', '', fname))
+            color = _get_color_from_filename(fname)
             shutil.copy(src_image_dict[color], entry[1])
         return []
 
@@ -385,12 +397,12 @@ class IFImageDataConverter(BaseCommandLineTool):
             raise CellMapsError(self._outdir + ' already exists')
 
         os.makedirs(self._outdir, mode=0o755)
+        # output directory was just created so color directories
+        # cannot exist yet and its parents need not be checked
         for cur_color in constants.COLORS:
             cdir = os.path.join(self._outdir, cur_color)
-            if not os.path.isdir(cdir):
-                logger.debug('Creating directory: ' + cdir)
-                os.makedirs(cdir,
-                            mode=0o755)
+            logger.debug('Creating directory: ' + cdir)
+            os.mkdir(cdir, mode=0o755)
 
     def _get_color_download_map(self):
         """
@@ -519,10 +531,11 @@ class IFImageDataConverter(BaseCommandLineTool):
         dset_ids = []
 
         for c in constants.COLORS:
-            for entry in tqdm(os.listdir(os.path.join(self._outdir, c)), desc='FAIRSCAPE ' + c + ' images registration'):
-                if not entry.endswith(self._imgsuffix):
-                    continue
-                fullpath = os.path.join(self._outdir, c, entry)
+            # scandir avoids a stat call per file to skip non files
+            with os.scandir(os.path.join(self._outdir, c)) as it:
+                images = [(e.name, e.path) for e in it
+                          if e.name.endswith(self._imgsuffix) and e.is_file()]
+            for entry, fullpath in tqdm(images, desc='FAIRSCAPE ' + c + ' images registration'):
                 data_dict['name'] = entry + ' ' + c +\
                                     ' channel image'
                 if len(data_dict['name']) >= 64:
@@ -7,12 +7,57 @@ import platform
 import logging
 import logging.config
 import argparse
+from functools import lru_cache
 from cellmaps_utils import constants
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=1)
+def _get_platform_info():
+    """
+    Gets information about the platform. The result is cached since
+    some of the :py:mod:`platform` calls can invoke external commands
+
+    :return: platform, python version, system, and uname
+    :rtype: dict
+    """
+    return {'platform': str(platform.platform()),
+            'python': str(platform.python_version()),
+            'system': str(platform.system()),
+            'uname': str(platform.uname())}
+
+
+def _write_json(outfile, data):
+    """
+    Writes **data** as JSON with an indent of 2 to **outfile**.
+    If `orjson <https://github.com/ijl/orjson>`__ is installed it is used
+    to encode **data**, otherwise the standard :py:mod:`json` module is used
+
+    :param outfile: path to file to write
+    :type outfile: str
+    :param data: data to write
+    :type data: dict
+    """
+    payload = None
+    if orjson is not None:
+        try:
+            payload = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+        except TypeError as te:
+            logger.debug('orjson unable to encode data, using json: ' + str(te))
+    if payload is None:
+        payload = json.dumps(data, indent=2).encode('utf-8')
+    # buffer large enough that task files are written in one system call
+    with open(outfile, 'wb', buffering=65536) as f:
+        f.write(payload)
+
+
 def setup_cmd_logging(args):
     """
     Sets up logging based on parsed command line arguments.
@@ -95,20 +140,16 @@ def write_task_start_json(outdir=None, start_time=None,
             'pid': str(os.getpid()),
             'outdir': outdir,
             'login': login,
-            'cwd': str(os.getcwd()),
-            'platform': str(platform.platform()),
-            'python': str(platform.python_version()),
-            'system': str(platform.system()),
-            'uname': str(platform.uname())
+            'cwd': str(os.getcwd())
             }
+    task.update(_get_platform_info())
     if data is not None:
         task.update(data)
 
-    with open(os.path.join(outdir,
-                           constants.TASK_FILE_PREFIX +
-                           str(start_time) +
-                           constants.TASK_START_FILE_SUFFIX), 'w') as f:
-        json.dump(task, f, indent=2)
+    _write_json(os.path.join(outdir,
+                             constants.TASK_FILE_PREFIX +
+                             str(start_time) +
+                             constants.TASK_START_FILE_SUFFIX), task)
 
 
 def write_task_finish_json(outdir=None, start_time=None,
@@ -154,11 +195,10 @@ def write_task_finish_json(outdir=None, start_time=None,
                 'elapsed_time': int(end_time - start_time),
                 'status': str(status)
                 }
-        with open(os.path.join(outdir,
-                               constants.TASK_FILE_PREFIX +
-                               str(start_time) +
-                               constants.TASK_FINISH_FILE_SUFFIX), 'w') as f:
-            json.dump(task, f, indent=2)
+        _write_json(os.path.join(outdir,
+                                 constants.TASK_FILE_PREFIX +
+                                 str(start_time) +
+                                 constants.TASK_FINISH_FILE_SUFFIX), task)
 
 
 def setup_filelogger(outdir=None, handlerprefix='cellmaps'):
@@ -180,35 +220,25 @@ def setup_filelogger(outdir=None, handlerprefix='cellmaps'):
 
     err_log_file = os.path.join(outdir, constants.ERROR_LOG_FILE)
     out_log_file = os.path.join(outdir, constants.OUTPUT_LOG_FILE)
-    logging.config.dictConfig({'version': 1,
-                               'propagate': True,
-                               'disable_existing_loggers': False,
-                               'loggers': {
-                                 '': {
-                                     'level': 'NOTSET',
-                                     'handlers': [handlerprefix + '_file_handler',
-                                                  handlerprefix + '_error_file_handler']
-                                 }
-                               },
-                               'handlers': {
-                                   handlerprefix + '_file_handler': {
-                                       'level': 'DEBUG',
-                                       'class': 'logging.FileHandler',
-                                       'formatter': handlerprefix + '_formatter',
-                                       'filename': out_log_file,
-                                       'mode': 'a'
-                                   },
-                                   handlerprefix + '_error_file_handler': {
-                                       'level': 'ERROR',
-                                       'class': 'logging.FileHandler',
-                                       'formatter': handlerprefix + '_formatter',
-                                       'filename': err_log_file,
-                                       'mode': 'a'
-                                   }
-                               },
-                               'formatters': {
-                                   handlerprefix + '_formatter': {
-                                       'format': constants.LOG_FORMAT
-                                   }
-                               }
-                               })
+
+    formatter = logging.Formatter(constants.LOG_FORMAT)
+
+    file_handler = logging.FileHandler(out_log_file, mode='a')
+    file_handler.set_name(handlerprefix + '_file_handler')
+    file_handler.setLevel(logging.DEBUG)
+    file_handler.setFormatter(formatter)
+
+    error_file_handler = logging.FileHandler(err_log_file, mode='a')
+    error_file_handler.set_name(handlerprefix + '_error_file_handler')
+    error_file_handler.setLevel(logging.ERROR)
+    error_file_handler.setFormatter(formatter)
+
+    # root logger is left with just the two file handlers which
+    # matches what logging.config.dictConfig() did previously
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+        handler.close()
+    root_logger.setLevel(logging.NOTSET)
+    root_logger.addHandler(file_handler)
+    root_logger.addHandler(error_file_handler)
@@ -1,9 +1,47 @@
+import warnings
+from functools import lru_cache
 import numpy as np
 import pandas as pd
 import pickle
 import dill
-from sklearn.metrics.pairwise import manhattan_distances, euclidean_distances, cosine_similarity
-from scipy.spatial.distance import canberra
+from sklearn.metrics.pairwise import cosine_similarity
+from scipy.spatial.distance import pdist, squareform
+
+try:
+    from numba import njit, prange, get_num_threads
+except ImportError:
+    njit = None
+
+IO_BUFFER_SIZE = 1 << 20
+"""
+Buffer size in bytes used when saving and loading objects
+"""
+
+NUMBA_CANBERRA_MIN_ROWS = 1000
+"""
+Minimum number of rows before :py:func:`canberra_similarity` uses
+the `numba <https://numba.pydata.org>`__ kernel. Below this
+:py:func:`scipy.spatial.distance.pdist` is faster
+"""
+
+
+@lru_cache(maxsize=4)
+def _upper_tri_mask(n):
+    """
+    Gets boolean mask selecting values above the diagonal of an
+    **n** by **n** matrix. A boolean mask uses 1 byte per cell instead
+    of two int64 index arrays and selects values in row major order
+    same as :py:func:`numpy.triu_indices`. Masks are cached
+    for repeated calls with matrices of the same size
+
+    :param n: number of rows/columns in matrix
+    :type n: int
+    :return: read only boolean mask
+    :rtype: :py:class:`numpy.ndarray`
+    """
+    mask = np.arange(n)[:, None] < np.arange(n)
+    mask.setflags(write=False)
+    return mask
 
 
 def upper_tri_values(df):
@@ -16,22 +54,102 @@ def upper_tri_values(df):
     :rtype: :py:func:`numpy.array`
     """
     m = df.values
-    return m[np.triu_indices(df.shape[0], k=1)]
+    return m[_upper_tri_mask(df.shape[0])]
 
 
 def znorm(df):
     """
-    Z-transform within each column.
+    Z-transform within each column using sample standard
+    deviation (``ddof=1``). ``NaN`` values are ignored when computing
+    mean and standard deviation. Columns with constant
+    values are set to ``0`` instead of ``NaN``
 
     :param df:
     :return:
     :rtype: :py:class:`pandas.DataFrame`
     """
-    norm_df = pd.DataFrame(index=df.index, columns=df.columns)
-    for c in df.columns:
-        value = df[c]
-        norm_df[c] = (value - value.mean()) / value.std()
-    return norm_df
+    mat = df.to_numpy(dtype=np.float64, copy=True)
+    with warnings.catch_warnings():
+        # all NaN or single value columns are left as NaN
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        mean = np.nanmean(mat, axis=0)
+        std = np.nanstd(mat, axis=0, ddof=1)
+    std[std == 0] = 1.0
+    mat -= mean
+    mat /= std
+    return pd.DataFrame(mat, index=df.index, columns=df.columns)
+
+
+def _min_max_scale(mat):
+    """
+    Scales **mat** into [0, 1] in place by subtracting the minimum
+    and dividing by the range. Both reductions are done up front
+    so the matrix is only traversed twice to update values.
+    ``NaN`` values are ignored when finding the minimum and maximum
+
+    :param mat: 2D array of values
+    :type mat: :py:class:`numpy.ndarray`
+    :return: **mat** scaled into [0, 1]
+    :rtype: :py:class:`numpy.ndarray`
+    """
+    shift = np.nanmin(mat)
+    scale = np.nanmax(mat) - shift
+    np.subtract(mat, shift, out=mat)
+    np.multiply(mat, 1.0 / scale, out=mat)
+    return mat
+
+
+def _distance_to_similarity(dist):
+    """
+    Converts distance matrix **dist** to similarity by max-minus
+    and scales the result into [0, 1]. This is done in place
+
+    :param dist: 2D array of distances
+    :type dist: :py:class:`numpy.ndarray`
+    :return: **dist** converted to similarity in [0, 1]
+    :rtype: :py:class:`numpy.ndarray`
+    """
+    max_dist = dist.max()
+    scale = max_dist - dist.min()
+    np.subtract(max_dist, dist, out=dist)
+    np.multiply(dist, 1.0 / scale, out=dist)
+    return dist
+
+
+def _as_array(df, dtype=np.float64, copy=False):
+    """
+    Gets values of **df** as a C contiguous array
+
+    :param df: values
+    :type df: :py:class:`pandas.DataFrame` or :py:class:`numpy.ndarray`
+    :param dtype: dtype of array, if ``None`` dtype of **df** is kept
+    :param copy: If ``True`` always return a new array, otherwise
+                 values of **df** are returned without a copy if possible
+    :type copy: bool
+    :rtype: :py:class:`numpy.ndarray`
+    """
+    if isinstance(df, pd.DataFrame):
+        df = df.to_numpy()
+    if copy:
+        return np.array(df, dtype=dtype, order='C')
+    return np.ascontiguousarray(df, dtype=dtype)
+
+
+def _as_result(mat, df):
+    """
+    Wraps **mat** in a :py:class:`pandas.DataFrame` with index and columns
+    set to the index of **df** if **df** is a :py:class:`pandas.DataFrame`
+    otherwise **mat** is returned as is
+
+    :param mat: pairwise similarity or correlation of rows in **df**
+    :type mat: :py:class:`numpy.ndarray`
+    :param df: values passed to public function
+    :type df: :py:class:`pandas.DataFrame` or :py:class:`numpy.ndarray`
+    :rtype: :py:class:`pandas.DataFrame` or :py:class:`numpy.ndarray`
+    """
+    if isinstance(df, pd.DataFrame):
+        return pd.DataFrame(mat, index=df.index, columns=df.index)
+    return mat
 
 
 def cosine_similarity_scaled(df):
@@ -40,15 +158,13 @@ def cosine_similarity_scaled(df):
     Similarity scaled into [0, 1]
 
     :param df:
-    :return:
-    :rtype: :py:class:`pandas.DataFrame`
+    :type df: :py:class:`pandas.DataFrame` or :py:class:`numpy.ndarray`
+    :return: :py:class:`pandas.DataFrame` indexed by rows of **df** if **df**
+             is a :py:class:`pandas.DataFrame`, otherwise :py:class:`numpy.ndarray`
+    :rtype: :py:class:`pandas.DataFrame` or :py:class:`numpy.ndarray`
     """
-    sim = cosine_similarity(df)
-    shift = sim.min()
-    sim -= shift
-    scale = sim.max()
-    sim /= scale
-    return pd.DataFrame(sim, index=df.index.values, columns=df.index.values)
+    sim = _min_max_scale(cosine_similarity(_as_array(df)))
+    return _as_result(sim, df)
 
 
 def manhattan_similarity(df):
@@ -57,16 +173,39 @@ def manhattan_similarity(df):
     Similarity scaled into [0, 1]
 
     :param df:
-    :return:
-    :rtype: :py:class:`pandas.DataFrame`
+    :type df: :py:class:`pandas.DataFrame` or :py:class:`numpy.ndarray`
+    :return: :py:class:`pandas.DataFrame` indexed by rows of **df** if **df**
+             is a :py:class:`pandas.DataFrame`, otherwise :py:class:`numpy.ndarray`
+    :rtype: :py:class:`pandas.DataFrame` or :py:class:`numpy.ndarray`
+    """
+    arr = _as_array(df)
+    # Get manhattan distance, pdist only computes each pair once
+    dist = squareform(pdist(arr, metric='cityblock'))
+    # Convert distance to similarity by max-minus and scale into [0,1]
+    sim = _distance_to_similarity(dist)
+    return _as_result(sim, df)
+
+
+def _euclidean_distances(arr):
+    """
+    Calculate Euclidean distance between each pair of rows in **arr**
+    using ``||x-y||^2 = ||x||^2 + ||y||^2 - 2 x.y`` so the bulk of the
+    work is a single matrix product. Computation is done in the
+    dtype of **arr**
+
+    :param arr: 2D array of values
+    :type arr: :py:class:`numpy.ndarray`
+    :return: Symmetric distance matrix
+    :rtype: :py:class:`numpy.ndarray`
     """
-    # Get manhattan distance
-    dist = manhattan_distances(df)
-    # Convert distance to similarity by max-minus
-    sim = dist.max() - dist
-    # Scale into [0,1]
-    sim /= sim.max()
-    return pd.DataFrame(sim, index=df.index.values, columns=df.index.values)
+    sq_norms = np.einsum('ij,ij->i', arr, arr)
+    dist = arr @ arr.T
+    dist *= -2
+    dist += sq_norms[:, None]
+    dist += sq_norms[None, :]
+    np.maximum(dist, 0, out=dist)
+    np.fill_diagonal(dist, 0)
+    return np.sqrt(dist, out=dist)
 
 
 def euclidean_similarity(df):
@@ -74,17 +213,70 @@ def euclidean_similarity(df):
     Calculate Euclidean similarity between each pair of rows in a DataFrame.
     Similarity scaled into [0, 1]
 
+    If values in **df** are ``float32`` the computation is done in
+    ``float32``, otherwise ``float64`` is used
+
     :param df:
-    :return:
-    :rtype: :py:class:`pandas.DataFrame`
+    :type df: :py:class:`pandas.DataFrame` or :py:class:`numpy.ndarray`
+    :return: :py:class:`pandas.DataFrame` indexed by rows of **df** if **df**
+             is a :py:class:`pandas.DataFrame`, otherwise :py:class:`numpy.ndarray`
+    :rtype: :py:class:`pandas.DataFrame` or :py:class:`numpy.ndarray`
     """
+    arr = _as_array(df, dtype=None)
+    if arr.dtype != np.float32:
+        arr = arr.astype(np.float64, copy=False)
     # Get euclidean distance
-    dist = euclidean_distances(df)
-    # Convert distance to similarity by max-minus
-    sim = dist.max() - dist
-    # Scale into [0,1]
-    sim /= sim.max()
-    return pd.DataFrame(sim, index=df.index.values, columns=df.index.values)
+    dist = _euclidean_distances(arr)
+    # Convert distance to similarity by max-minus and scale into [0,1]
+    sim = _distance_to_similarity(dist)
+    return _as_result(sim, df)
+
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _canberra_matrix(arr):
+        """
+        Calculate Canberra distance between each pair of rows in **arr**.
+        Only used if `numba <https://numba.pydata.org>`__ is installed.
+        Terms where both values are ``0`` contribute ``0`` to the distance
+        which matches :py:func:`scipy.spatial.distance.canberra`.
+        The first call in a new environment compiles this function which
+        takes a few seconds. The compiled result is cached on disk
+        for later processes
+
+        :param arr: 2D array of values
+        :type arr: :py:class:`numpy.ndarray`
+        :return: Symmetric distance matrix
+        :rtype: :py:class:`numpy.ndarray`
+        """
+        n = arr.shape[0]
+        dist = np.zeros((n, n), dtype=np.float64)
+        for i in prange(n - 1):
+            for j in range(i + 1, n):
+                d = 0.0
+                for k in range(arr.shape[1]):
+                    denom = abs(arr[i, k]) + abs(arr[j, k])
+                    if denom != 0.0:
+                        d += abs(arr[i, k] - arr[j, k]) / denom
+                dist[i, j] = d
+                dist[j, i] = d
+        return dist
+
+
+def _use_numba_canberra(num_rows):
+    """
+    Decides if the `numba <https://numba.pydata.org>`__ kernel should
+    be used to compute Canberra distances. It is only faster than
+    :py:func:`scipy.spatial.distance.pdist` for large inputs computed
+    with more than one thread
+
+    :param num_rows: number of rows in input
+    :type num_rows: int
+    :return: ``True`` if numba kernel should be used
+    :rtype: bool
+    """
+    return njit is not None and num_rows >= NUMBA_CANBERRA_MIN_ROWS \
+        and get_num_threads() > 1
 
 
 def canberra_similarity(df):
@@ -93,24 +285,19 @@ def canberra_similarity(df):
     Similarity scaled into [0, 1]
 
     :param df:
-    :return:
-    :rtype: :py:class:`pandas.DataFrame`
+    :type df: :py:class:`pandas.DataFrame` or :py:class:`numpy.ndarray`
+    :return: :py:class:`pandas.DataFrame` indexed by rows of **df** if **df**
+             is a :py:class:`pandas.DataFrame`, otherwise :py:class:`numpy.ndarray`
+    :rtype: :py:class:`pandas.DataFrame` or :py:class:`numpy.ndarray`
     """
-    index = df.index.values
-    dist = pd.DataFrame(0, index=index, columns=index, dtype=float)
-    for i in range(len(index) - 1):
-        a = df.loc[index[i]].values
-        for j in range(i + 1, len(index)):
-            b = df.loc[index[j]].values
-            d = canberra(a, b)
-            dist.at[index[i], index[j]] = d
-            dist.at[index[j], index[i]] = d
-    dist = dist.values
-    # Convert distance to similarity by max-minus
-    sim = dist.max() - dist
-    # Scale into [0,1]
-    sim /= sim.max()
-    return pd.DataFrame(sim, index=index, columns=index)
+    arr = _as_array(df)
+    if _use_numba_canberra(arr.shape[0]):
+        dist = _canberra_matrix(arr)
+    else:
+        dist = squareform(pdist(arr, metric='canberra'))
+    # Convert distance to similarity by max-minus and scale into [0,1]
+    sim = _distance_to_similarity(dist)
+    return _as_result(sim, df)
 
 
 def pearson_scaled(df):
@@ -119,15 +306,23 @@ def pearson_scaled(df):
     Correlation scaled into [0, 1]
 
     :param df:
-    :return:
-    :rtype: :py:class:`pandas.DataFrame`
+    :type df: :py:class:`pandas.DataFrame` or :py:class:`numpy.ndarray`
+    :return: :py:class:`pandas.DataFrame` indexed by rows of **df** if **df**
+             is a :py:class:`pandas.DataFrame`, otherwise :py:class:`numpy.ndarray`
+    :rtype: :py:class:`pandas.DataFrame` or :py:class:`numpy.ndarray`
     """
-    corr = df.T.corr(method='pearson')
-    shift = corr.min().min()
-    corr -= shift
-    scale = corr.max().max()
-    corr /= scale
-    return corr
+    mat = _as_array(df, copy=True)
+    if np.isnan(mat).any():
+        # pairwise handling of missing values is left to pandas
+        mat = pd.DataFrame(mat).T.corr(method='pearson').to_numpy(dtype=np.float64, copy=True)
+    else:
+        # correlation of z-normalized rows is a single matrix product
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mat -= mat.mean(axis=1, keepdims=True)
+            mat /= mat.std(axis=1, keepdims=True)
+            mat = (mat @ mat.T) / mat.shape[1]
+    mat = _min_max_scale(mat)
+    return _as_result(mat, df)
 
 
 def spearman_scaled(df):
@@ -136,14 +331,14 @@ def spearman_scaled(df):
     Correlation scaled into [0, 1]
 
     :param df:
-    :return:
+    :type df: :py:class:`pandas.DataFrame` or :py:class:`numpy.ndarray`
+    :return: :py:class:`pandas.DataFrame` indexed by rows of **df** if **df**
+             is a :py:class:`pandas.DataFrame`, otherwise :py:class:`numpy.ndarray`
+    :rtype: :py:class:`pandas.DataFrame` or :py:class:`numpy.ndarray`
     """
-    corr = df.T.corr(method='spearman')
-    shift = corr.min().min()
-    corr -= shift
-    scale = corr.max().max()
-    corr /= scale
-    return corr
+    corr = pd.DataFrame(_as_array(df)).T.corr(method='spearman')
+    mat = _min_max_scale(corr.to_numpy(dtype=np.float64, copy=True))
+    return _as_result(mat, df)
 
 
 def kendall_scaled(df):
@@ -152,30 +347,72 @@ def kendall_scaled(df):
     Correlation scaled into [0, 1]
 
     :param df:
-    :return:
+    :type df: :py:class:`pandas.DataFrame` or :py:class:`numpy.ndarray`
+    :return: :py:class:`pandas.DataFrame` indexed by rows of **df** if **df**
+             is a :py:class:`pandas.DataFrame`, otherwise :py:class:`numpy.ndarray`
+    :rtype: :py:class:`pandas.DataFrame` or :py:class:`numpy.ndarray`
+    """
+    corr = pd.DataFrame(_as_array(df)).T.corr(method='kendall')
+    mat = _min_max_scale(corr.to_numpy(dtype=np.float64, copy=True))
+    return _as_result(mat, df)
+
+
+def _is_close(x, y, rtol, atol):
+    """
+    Element wise check that **x** and **y** are within tolerance of
+    each other in both directions. Same as requiring
+    :py:func:`numpy.isclose` of ``(x, y)`` and ``(y, x)``
+
+    :return: boolean array
+    :rtype: :py:class:`numpy.ndarray`
     """
-    corr = df.T.corr(method='kendall')
-    shift = corr.min().min()
-    corr -= shift
-    scale = corr.max().max()
-    corr /= scale
-    return corr
+    return (x == y) | (np.abs(x - y) <= atol + rtol * np.minimum(np.abs(x), np.abs(y)))
 
 
-def check_symmetric(a, rtol=1e-05, atol=1e-08):
+def check_symmetric(a, rtol=1e-05, atol=1e-08, sample_size=None,
+                    block_size=1024):
     """
     Check if the given numpy matrix is symmetric or not.
 
+    Only values above the diagonal are compared against their
+    transposed counterparts, one block of rows at a time, and the
+    check stops at the first block that is not symmetric
+
     :param a:
     :param rtol:
     :param atol:
-    :return:
+    :param sample_size: If set, only compare this many randomly
+                        chosen pairs of values instead of the whole matrix.
+                        Useful as a quick approximate check on large matrices
+    :type sample_size: int
+    :param block_size: Number of rows compared at a time
+    :type block_size: int
+    :return: ``True`` if **a** is square and symmetric otherwise ``False``
+    :rtype: bool
     """
-    return np.allclose(a, a.T, rtol=rtol, atol=atol)
+    a = np.asarray(a)
+    if a.ndim != 2 or a.shape[0] != a.shape[1]:
+        return False
+    n = a.shape[0]
+    if sample_size is not None:
+        rng = np.random.default_rng()
+        rows = rng.integers(0, n, size=sample_size)
+        cols = rng.integers(0, n, size=sample_size)
+        return bool(np.all(_is_close(a[rows, cols], a[cols, rows],
+                                     rtol=rtol, atol=atol)))
+
+    for start in range(0, n, block_size):
+        end = min(start + block_size, n)
+        if not np.all(_is_close(a[start:end, start:], a[start:, start:end].T,
+                                rtol=rtol, atol=atol)):
+            return False
+    return True
 
 
 def save_obj(obj, fname, method='pickle'):
     """
+    Saves **obj** to **fname** using
+    :py:const:`pickle.HIGHEST_PROTOCOL`
 
     :param obj: object that want to be saved
     :param fname: path to saved file
@@ -184,11 +421,11 @@ def save_obj(obj, fname, method='pickle'):
     :type method: str
     :raises ValueError: if **method** is not set to ``pickle`` or ``dill``
     """
-    with open(fname, 'wb') as f:
+    with open(fname, 'wb', buffering=IO_BUFFER_SIZE) as f:
         if method == 'pickle':
-            pickle.dump(obj, f)
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
         elif method == 'dill':
-            dill.dump(obj, f)
+            dill.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
         else:
             raise ValueError('Please select method from {pickle, dill}!')
     return
@@ -204,7 +441,7 @@ def load_obj(fname, method='pickle'):
     :type method: str
     :raises ValueError: if **method** is not set to ``pickle`` or ``dill``
     """
-    with open(fname, 'rb') as f:
+    with open(fname, 'rb', buffering=IO_BUFFER_SIZE) as f:
         if method == 'pickle':
             return pickle.load(f)
         elif method == 'dill':
@@ -216,13 +453,21 @@ def load_obj(fname, method='pickle'):
 
 def jaccard(setA, setB):
     """
-    Calculates jaccard
+    Calculates jaccard. If both sets are empty ``0.0`` is returned
 
     :param setA:
     :param setB:
     :return:
     """
-    return len(setA.intersection(setB)) / len(setA.union(setB))
+    if not setA or not setB:
+        return 0.0
+    # count intersection by iterating smaller set and derive union size
+    if len(setA) <= len(setB):
+        smaller, larger = setA, setB
+    else:
+        smaller, larger = setB, setA
+    intersection = sum(1 for x in smaller if x in larger)
+    return intersection / (len(setA) + len(setB) - intersection)
 
 
 def scaled_P_to_nm(scaled_P):
@@ -1,10 +1,11 @@
+import io
 import os
 import time
 import uuid
 
 import ndex2
 import logging
-import copy
+from concurrent.futures import ThreadPoolExecutor
 from cellmaps_utils import constants
 
 from ndex2.cx2 import RawCX2NetworkFactory, CX2Network
@@ -12,6 +13,11 @@ from requests import RequestException
 
 from cellmaps_utils.exceptions import CellMapsError
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
 
@@ -72,33 +78,120 @@ class NDExHierarchyUploader(object):
         This method saves a network to the NDEx server and returns the unique NDEx UUID for the network
         along with its URL. The visibility of the saved network is determined by the variable `self._visibility`.
 
-        :param network: Network to save
-        :type network: :py:class:`~ndex2.cx2.CX2Network`
+        :param network: Network to save or output of :py:meth:`~ndex2.cx2.CX2Network.to_cx2`
+        :type network: :py:class:`~ndex2.cx2.CX2Network` or list
+        :param max_retries: Maximum number of attempts to save network
+        :type max_retries: int
+        :param retry_wait: Seconds to wait after first failed attempt. The
+                           wait doubles after each subsequent failed attempt
+        :type retry_wait: float
         :return: NDEX UUID of network
         :rtype: str
         """
-        logger.debug('Saving network named: ' + str(network.get_name()) +
+        if isinstance(network, list):
+            cx2_network = network
+            network_name = self._get_name_from_cx2(cx2_network)
+        else:
+            network_name = network.get_name()
+            # serialize once, network does not change between retries
+            cx2_network = self._get_cx2(network)
+        payload = self._get_cx2_payload(cx2_network)
+        logger.debug('Saving network named: ' + str(network_name) +
                      ' to NDEx with visibility set to: ' + str(self._visibility))
         retry_num = 1
         while retry_num <= max_retries:
             try:
-                res = self._ndexclient.save_new_cx2_network(network.to_cx2(),
-                                                            visibility=self._visibility)
+                res = self._upload_cx2(cx2_network, payload=payload)
                 if not isinstance(res, str):
                     raise CellMapsError('Expected a str, but got this: ' + str(res))
 
-                ndexuuid = res[res.rfind('/') + 1:]
+                ndexuuid = res.rpartition('/')[2]
 
                 return ndexuuid, res.replace('v3', 'viewer')
             except RequestException as re:
                 if retry_num == max_retries:
-                    raise CellMapsError(str(max_retries) + 'attempts to save the network failed.')
-                logger.debug(str(re.response.text))
+                    raise CellMapsError(str(max_retries) + ' attempts to save the network failed.')
+                if re.response is not None:
+                    logger.debug(str(re.response.text))
+                else:
+                    logger.debug(str(re))
+                # back off exponentially between attempts
+                time.sleep(retry_wait * (2 ** (retry_num - 1)))
                 retry_num += 1
-                time.sleep(retry_wait)
             except Exception as e:
                 raise CellMapsError('An error occurred while saving the network to NDEx: ' + str(e))
 
+    @staticmethod
+    def _get_cx2_payload(cx2_network):
+        """
+        Encodes **cx2_network** to JSON bytes with
+        `orjson <https://pypi.org/project/orjson>`__
+
+        :param cx2_network: CX2 network
+        :type cx2_network: list
+        :return: JSON encoded **cx2_network** or ``None`` if orjson is
+                 not available or unable to encode **cx2_network**
+        :rtype: bytes
+        """
+        if orjson is None or not isinstance(cx2_network, list) or len(cx2_network) == 0:
+            return None
+        try:
+            return orjson.dumps(cx2_network, option=orjson.OPT_SERIALIZE_NUMPY)
+        except TypeError as te:
+            logger.debug('Unable to encode network with orjson: ' + str(te))
+            return None
+
+    def _upload_cx2(self, cx2_network, payload=None):
+        """
+        Uploads network to NDEx. If **payload** is set it is
+        streamed to NDEx as is, otherwise **cx2_network** is passed to
+        :py:meth:`~ndex2.client.Ndex2.save_new_cx2_network`
+
+        :param cx2_network: CX2 network
+        :type cx2_network: list
+        :param payload: JSON encoded **cx2_network**
+        :type payload: bytes
+        :return: URL of saved network
+        :rtype: str
+        """
+        if payload is None:
+            return self._ndexclient.save_new_cx2_network(cx2_network,
+                                                         visibility=self._visibility)
+        return self._ndexclient.save_cx2_stream_as_new_network(io.BytesIO(payload),
+                                                               visibility=self._visibility)
+
+    @staticmethod
+    def _get_cx2(network):
+        """
+        Serializes **network** to CX2
+
+        :param network: Network to serialize
+        :type network: :py:class:`~ndex2.cx2.CX2Network`
+        :raises CellMapsError: If serialization fails
+        :return: CX2 network
+        :rtype: list
+        """
+        try:
+            return network.to_cx2()
+        except Exception as e:
+            raise CellMapsError('An error occurred while saving the network to NDEx: ' + str(e))
+
+    @staticmethod
+    def _get_name_from_cx2(cx2_network):
+        """
+        Gets name of network from networkAttributes aspect of **cx2_network**
+
+        :param cx2_network: CX2 network
+        :type cx2_network: list
+        :return: name of network or ``None`` if not found
+        :rtype: str
+        """
+        for aspect in cx2_network:
+            if 'networkAttributes' in aspect:
+                for net_attrs in aspect['networkAttributes']:
+                    return net_attrs.get('name')
+        return None
+
     def get_cytoscape_url(self, ndexurl):
         """
         Generates a Cytoscape URL for a given NDEx network URL.
@@ -108,8 +201,8 @@ class NDExHierarchyUploader(object):
         :return: The URL pointing to the network's view on the Cytoscape platform.
         :rtype: str
         """
-        ndexuuid = ndexurl[ndexurl.rfind('/') + 1:]
-        network_url = (f"https://{self._server.replace('https://', '').replace('http://', '')}"
+        ndexuuid = ndexurl.rpartition('/')[2]
+        network_url = (f"https://{self._server.split('://', 1)[-1]}"
                        f"/cytoscape/0/networks/{ndexuuid}")
         return network_url
 
@@ -125,10 +218,74 @@ class NDExHierarchyUploader(object):
         :return: The updated hierarchy with the HCX annotations.
         :rtype: `~ndex2.cx2.CX2Network`
         """
-        hierarchy_copy = copy.deepcopy(hierarchy)
-        hierarchy_copy.add_network_attribute('HCX::interactionNetworkUUID', str(interactome_id))
-        hierarchy_copy.remove_network_attribute('HCX::interactionNetworkName')
-        return hierarchy_copy
+        # annotations are applied by _update_hcx_annotations_in_cx2 so
+        # there is only one implementation
+        cx2_network = self._update_hcx_annotations_in_cx2(hierarchy.to_cx2(),
+                                                          interactome_id)
+        return RawCX2NetworkFactory().get_cx2network(cx2_network)
+
+    @staticmethod
+    def _update_hcx_annotations_in_cx2(cx2_network, interactome_id):
+        """
+        Updates **cx2_network** that was output by :py:meth:`~ndex2.cx2.CX2Network.to_cx2`
+        with HCX annotations, setting *HCX::interactionNetworkUUID* to
+        **interactome_id** and removing *HCX::interactionNetworkName* if present.
+        The attribute declarations and network attributes aspects are replaced
+        with updated copies since their contents are shared with the
+        :py:class:`~ndex2.cx2.CX2Network` that was serialized
+
+        :param cx2_network: CX2 hierarchy
+        :type cx2_network: list
+        :param interactome_id: The unique ID (UUID) of the interactome that is associated with the hierarchy.
+        :type interactome_id: str
+        :return: **cx2_network** with the HCX annotations
+        :rtype: list
+        """
+        decl_index = None
+        net_attrs_index = None
+        meta_data = None
+        for index, aspect in enumerate(cx2_network):
+            if 'attributeDeclarations' in aspect:
+                decl_index = index
+            elif 'networkAttributes' in aspect:
+                net_attrs_index = index
+            elif 'metaData' in aspect:
+                meta_data = aspect['metaData']
+
+        if decl_index is None:
+            declarations = {}
+        else:
+            declarations = dict(cx2_network[decl_index]['attributeDeclarations'][0])
+        net_attr_decls = dict(declarations.get('networkAttributes', {}))
+        net_attr_decls.pop('HCX::interactionNetworkName', None)
+        net_attr_decls.setdefault('HCX::interactionNetworkUUID', {'d': 'string'})
+        declarations['networkAttributes'] = net_attr_decls
+
+        if net_attrs_index is None:
+            net_attrs = {}
+        else:
+            net_attrs = dict(cx2_network[net_attrs_index]['networkAttributes'][0])
+        net_attrs.pop('HCX::interactionNetworkName', None)
+        net_attrs['HCX::interactionNetworkUUID'] = str(interactome_id)
+
+        # declarations must precede the aspects that use them so new
+        # aspects are put right after metaData
+        if decl_index is None:
+            decl_index = 2
+            cx2_network.insert(decl_index, {})
+            if net_attrs_index is not None and net_attrs_index >= decl_index:
+                net_attrs_index += 1
+            if meta_data is not None:
+                meta_data.append({'elementCount': 1, 'name': 'attributeDeclarations'})
+        cx2_network[decl_index] = {'attributeDeclarations': [declarations]}
+
+        if net_attrs_index is None:
+            net_attrs_index = decl_index + 1
+            cx2_network.insert(net_attrs_index, {})
+            if meta_data is not None:
+                meta_data.append({'elementCount': 1, 'name': 'networkAttributes'})
+        cx2_network[net_attrs_index] = {'networkAttributes': [net_attrs]}
+        return cx2_network
 
     def save_hierarchy_and_parent_network(self, hierarchy, parent_ppi):
         """
@@ -146,18 +303,46 @@ class NDExHierarchyUploader(object):
         """
         parent_url = None
         if isinstance(parent_ppi, CX2Network):
-            parent_uuid, parent_url = self._save_network(parent_ppi)
+            # serialize hierarchy while parent network is being uploaded
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                parent_future = executor.submit(self._save_network, parent_ppi)
+                hierarchy_cx2 = self._get_cx2(hierarchy)
+                parent_uuid, parent_url = parent_future.result()
         else:
             try:
                 _ = uuid.UUID(parent_ppi, version=4)
                 parent_uuid = parent_ppi
             except ValueError:
                 raise CellMapsError(f'Invalid UUID format for parent_ppi: {parent_ppi}')
+            hierarchy_cx2 = self._get_cx2(hierarchy)
 
-        hierarchy_for_ndex = self._update_hcx_annotations(hierarchy, parent_uuid)
+        hierarchy_for_ndex = self._update_hcx_annotations_in_cx2(hierarchy_cx2, parent_uuid)
         hierarchy_uuid, hierarchy_url = self._save_network(hierarchy_for_ndex)
         return parent_uuid, parent_url, hierarchy_uuid, hierarchy_url
 
+    @staticmethod
+    def _read_cx2_network(path):
+        """
+        Loads CX2 network from file. If `orjson <https://github.com/ijl/orjson>`__
+        is installed it is used to parse the file, otherwise
+        :py:class:`~ndex2.cx2.RawCX2NetworkFactory` reads the file directly
+
+        :param path: path to CX2 file
+        :type path: str
+        :return: network
+        :rtype: :py:class:`~ndex2.cx2.CX2Network`
+        """
+        cx_factory = RawCX2NetworkFactory()
+        if orjson is not None:
+            with open(path, 'rb') as f:
+                data = f.read()
+            try:
+                return cx_factory.get_cx2network(orjson.loads(data))
+            except orjson.JSONDecodeError as je:
+                logger.debug('orjson unable to parse ' + str(path) +
+                             ', using json: ' + str(je))
+        return cx_factory.get_cx2network(path)
+
     def upload_hierarchy_and_parent_network_from_files(self, hier_dir=None, hierarchy_path=None, parent_path=None):
         """
         Uploads hierarchy and parent network to NDEx from CX2 files.
@@ -186,8 +371,12 @@ class NDExHierarchyUploader(object):
         if not parent_path or not os.path.exists(parent_path):
             raise CellMapsError(f'Parent network file does not exist at {parent_path}.')
 
-        cx_factory = RawCX2NetworkFactory()
-        hierarchy_network = cx_factory.get_cx2network(hierarchy_path)
-        parent_network = cx_factory.get_cx2network(parent_path)
+        # read both files at the same time so reading of one can
+        # overlap with parsing of the other
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            hierarchy_future = executor.submit(self._read_cx2_network, hierarchy_path)
+            parent_future = executor.submit(self._read_cx2_network, parent_path)
+            hierarchy_network = hierarchy_future.result()
+            parent_network = parent_future.result()
 
         return self.save_hierarchy_and_parent_network(hierarchy_network, parent_network)
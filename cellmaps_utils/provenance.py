@@ -1,24 +1,89 @@
 import os
+import io
+import stat
 import sys
+import shutil
+import signal
 import subprocess
 import logging
+import threading
+import contextlib
 import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import getpass
 from datetime import date
 import json
+import pathlib
 
 from cellmaps_utils import constants
 from cellmaps_utils.exceptions import CellMapsProvenanceError
 
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
 
+def _json_loads(data):
+    """
+    Parses JSON **data** with `orjson <https://pypi.org/project/orjson>`__
+    if available, otherwise with :py:func:`json.loads`
+
+    :param data: JSON to parse
+    :type data: bytes
+    :return: parsed data
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _json_dumps(data):
+    """
+    Encodes **data** as a single line of JSON with
+    `orjson <https://pypi.org/project/orjson>`__ if available,
+    otherwise with :py:func:`json.dumps`
+
+    :param data: data to encode
+    :return: JSON
+    :rtype: bytes
+    """
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data).encode('utf-8')
+
+
+def _intern(value):
+    """
+    Interns **value** via :py:func:`sys.intern` so duplicate strings
+    from different `RO-Crates <https://www.researchobject.org/ro-crate/>`__
+    share one object
+
+    :param value: value to intern
+    :return: interned **value** if it is a :py:class:`str` otherwise **value**
+    """
+    if type(value) is str:
+        return sys.intern(value)
+    return value
+
+
 class ROCrateProvenanceAttributes(object):
     """
     Wrapper object to hold subset of
     `RO-Crate <https://www.researchobject.org/ro-crate/>`__ provenance attributes
     """
 
+    __slots__ = ('_name', '_organization_name', '_project_name',
+                 '_description', '_keywords')
+
     def __init__(self, name='Please enter a name',
                  organization_name='Please enter an organization',
                  project_name='Please enter a project',
@@ -100,8 +165,28 @@ class ProvenanceUtil(object):
     Wrapper around `FAIRSCAPE-cli <https://github.com/fairscape/fairscape-cli>`__ calls
     """
 
+    _CWD_LOCK = threading.Lock()
+
+    CRATE_CACHE_SIZE = 16
+    """
+    Maximum number of parsed ro-crate meta data files kept by
+    :py:meth:`_load_crate`
+    """
+
+    UUID_POOL_SIZE = 256
+    """
+    Number of UUIDs generated at a time by :py:meth:`_next_uuid`
+    """
+
+    PARALLEL_CRATE_THRESHOLD = 3
+    """
+    Number of `RO-Crates <https://www.researchobject.org/ro-crate/>`__ above which
+    :py:meth:`get_merged_rocrate_provenance_attrs` loads them in parallel
+    """
+
     def __init__(self, fairscape_binary='fairscape-cli',
-                 default_date_format_str='%Y-%m-%d', raise_on_error=False):
+                 default_date_format_str='%Y-%m-%d', raise_on_error=False,
+                 in_process=False):
         """
         Constructor
 
@@ -109,29 +194,57 @@ class ProvenanceUtil(object):
                                  If no path separators are included in this value
                                  (for example no ``/`` on Linux|mac) this code assumes the full
                                  path to the binary is the same directory where the python
-                                 binary executing this script resides. To bypass this
-                                 set the value to a full path with ex: ``/tmp/foo.py``
+                                 binary executing this script resides. If the binary
+                                 is not found there, it is looked up once on the ``PATH``.
+                                 To bypass this set the value to a full path with
+                                 ex: ``/tmp/foo.py``
         :type fairscape_binary: str
                 :param default_date_format_str: Default date format string
         :type default_date_format_str: str
         :param raise_on_error: Flag to determine if exceptions should be raised on errors
         :type raise_on_error: bool
+        :param in_process: If ``True`` and the ``fairscape_cli`` module can be
+                           imported, `FAIRSCAPE <https://github.com/fairscape/fairscape-cli>`__
+                           commands are run within this python process instead
+                           of spawning a new process for each call. Only used
+                           when **fairscape_binary** is left as the default
+                           ``fairscape-cli``. Timeouts are not enforced in this mode
+        :type in_process: bool
         """
         self._python = sys.executable
         if os.sep not in fairscape_binary:
             self._binary = os.path.join(os.path.dirname(self._python),
                                         fairscape_binary)
+            if not os.path.isfile(self._binary):
+                # resolve once here instead of failing on every call
+                found_binary = shutil.which(fairscape_binary)
+                if found_binary is not None:
+                    self._binary = found_binary
         else:
             self._binary = fairscape_binary
 
         self._default_date_fmt_str = default_date_format_str
         self._raise_on_error = raise_on_error
+        self._crate_cache = {}
+        self._crate_cache_lock = threading.Lock()
+        self._uuid_pool = deque()
+        self._uuid_pool_pid = None
+        self._fairscape_cli = None
+        if in_process and fairscape_binary == 'fairscape-cli':
+            try:
+                from fairscape_cli.__main__ import cli
+                self._fairscape_cli = cli
+            except ImportError as ie:
+                logger.debug('Unable to import fairscape_cli, falling back '
+                             'to running ' + str(self._binary) + ' : ' + str(ie))
 
     @staticmethod
     def _log_fairscape_error(cmd, exit_code, err,
                              reason='non zero exit code', cwd=None):
         """
-        Logs fairscape error to provenance_errors.json file
+        Appends fairscape error as a line of JSON to
+        :py:const:`~cellmaps_utils.constants.PROVENANCE_ERRORS_FILE` file.
+        See :py:meth:`read_provenance_errors` to read these errors
 
         :param cmd:
         :type cmd: list
@@ -158,19 +271,40 @@ class ProvenanceUtil(object):
             log_file = os.path.join(cwd, constants.PROVENANCE_ERRORS_FILE)
 
         try:
-            if not os.path.exists(log_file):
-                with open(log_file, 'w') as file:
-                    json.dump([log_entry], file, indent=4)
-            else:
-                with open(log_file, 'r+') as file:
-                    data = json.load(file)
-                    data.append(log_entry)
-                    file.seek(0)
-                    json.dump(data, file, indent=4)
+            with open(log_file, 'ab') as file:
+                file.write(_json_dumps(log_entry) + b'\n')
         except Exception as e:
             logger.error('Failed to log provenance error: ' + str(e))
         logger.error('Provenance call failed: ' + json.dumps(log_entry))
 
+    @staticmethod
+    def read_provenance_errors(path=None):
+        """
+        Generator that yields errors logged to
+        :py:const:`~cellmaps_utils.constants.PROVENANCE_ERRORS_FILE`
+        when **raise_on_error** passed into constructor is ``False``
+
+        Each error is a :py:class:`dict` of format:
+
+        .. code-block::
+
+            {'cmd': [<COMMAND>], 'exit_code': <EXIT CODE>, 'reason': <REASON>}
+
+        :param path: Directory containing errors file or path to errors file.
+                     If ``None`` current working directory is used
+        :type path: str
+        :return: logged errors in order they were logged
+        :rtype: dict
+        """
+        if path is None:
+            path = os.getcwd()
+        if os.path.isdir(path):
+            path = os.path.join(path, constants.PROVENANCE_ERRORS_FILE)
+        with open(path, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    yield _json_loads(line)
+
     def _run_cmd(self, cmd, cwd=None, timeout=360):
         """
         Runs command as a command line process
@@ -189,15 +323,22 @@ class ProvenanceUtil(object):
         """
         logger.debug('Running command under ' + str(cwd) +
                      ' path: ' + str(cmd))
+        if self._fairscape_cli is not None and\
+                cmd[:2] == [self._python, self._binary]:
+            return self._run_fairscape_in_process(cmd, cwd=cwd)
+
+        # run in own session so any child processes
+        # can be killed along with it on timeout
         p = subprocess.Popen(cmd, cwd=cwd,
                              text=True,
                              stdout=subprocess.PIPE,
-                             stderr=subprocess.PIPE)
+                             stderr=subprocess.PIPE,
+                             start_new_session=os.name == 'posix')
         try:
             out, err = p.communicate(timeout=timeout)
         except subprocess.TimeoutExpired:
             logger.warning('Timeout reached. Killing process')
-            p.kill()
+            self._kill_process(p)
             out, err = p.communicate()
             if self._raise_on_error:
                 raise CellMapsProvenanceError('Process timed out. '
@@ -216,6 +357,93 @@ class ProvenanceUtil(object):
             out = out.rstrip()
         return p.returncode, out, err
 
+    @staticmethod
+    def _kill_process(p):
+        """
+        Kills process **p** and, on POSIX systems, any processes it
+        started in its session so they do not hold its output pipes open
+
+        :param p: process started by :py:meth:`_run_cmd`
+        :type p: :py:class:`subprocess.Popen`
+        """
+        if os.name == 'posix':
+            try:
+                # process group id is the pid since process leads its session
+                os.killpg(p.pid, signal.SIGKILL)
+                return
+            except OSError as e:
+                logger.debug('Unable to kill process group ' +
+                             str(p.pid) + ' : ' + str(e))
+        p.kill()
+
+    @staticmethod
+    @contextlib.contextmanager
+    def _working_directory(cwd=None):
+        """
+        Context manager that changes the current working directory to
+        **cwd**, under a lock shared by all instances, and restores
+        it on exit. Used when running `FAIRSCAPE <https://github.com/fairscape/fairscape-cli>`__
+        in process so paths resolve the same as when run as a separate
+        process in **cwd**
+
+        :param cwd: directory to change to, if ``None`` directory is not changed
+        :type cwd: str
+        :raises OSError: If unable to change to **cwd** directory
+        """
+        with ProvenanceUtil._CWD_LOCK:
+            orig_cwd = os.getcwd()
+            if cwd is not None:
+                os.chdir(cwd)
+            try:
+                yield
+            finally:
+                os.chdir(orig_cwd)
+
+    def _run_fairscape_in_process(self, cmd, cwd=None):
+        """
+        Runs `FAIRSCAPE <https://github.com/fairscape/fairscape-cli>`__
+        command within this python process by invoking the
+        ``fairscape_cli`` click command directly. Only the
+        arguments after the python and binary in **cmd** are used.
+
+        Since some commands operate on the current working directory
+        the process changes to **cwd** while the command runs
+        and this is done under a lock.
+
+        :param cmd: command to run
+        :type cmd: list
+        :param cwd: current working directory
+        :type cwd: str
+        :raises OSError: If unable to change to **cwd** directory
+        :return: (return code, standard out, standard error)
+        :rtype: tuple
+        """
+        from click import ClickException
+
+        out_buf = io.StringIO()
+        err_buf = io.StringIO()
+        with self._working_directory(cwd):
+            try:
+                with contextlib.redirect_stdout(out_buf),\
+                        contextlib.redirect_stderr(err_buf):
+                    exit_code = self._fairscape_cli.main(args=cmd[2:],
+                                                         prog_name=os.path.basename(self._binary),
+                                                         standalone_mode=False)
+                if exit_code is None:
+                    exit_code = 0
+            except ClickException as ce:
+                exit_code = ce.exit_code
+                err_buf.write(ce.format_message())
+            except Exception as e:
+                exit_code = 1
+                err_buf.write(str(e))
+
+        out = out_buf.getvalue().rstrip()
+        err = err_buf.getvalue()
+        if not self._raise_on_error and exit_code != 0:
+            self._log_fairscape_error(cmd, exit_code, err, cwd=cwd)
+        return exit_code, out, err
+
     def _get_keywords(self, keywords=None):
         """
         Adds keywords to command
@@ -232,10 +460,7 @@ class ProvenanceUtil(object):
         if isinstance(keywords, str):
             return ['--keywords', keywords]
         if isinstance(keywords, list):
-            retlist = []
-            for k in keywords:
-                retlist.extend(['--keywords', k])
-            return retlist
+            return [x for k in keywords for x in ('--keywords', k)]
         raise CellMapsProvenanceError('Keywords must be a list or a '
                                       'str, but got: ' + str(type(keywords)))
 
@@ -251,12 +476,31 @@ class ProvenanceUtil(object):
         :return:  unique id with data type and path information appended
         :rtype: str
         """
-        if data_type is not None:
-            data_type_val = data_type
-        else:
-            data_type_val = ''
+        if data_type is None:
+            data_type = ''
+        return f'{self._next_uuid()}:{data_type}::{os.path.basename(str(rocrate_path))}'
+
+    def _next_uuid(self):
+        """
+        Gets next random (version 4) UUID from a pool that is filled
+        :py:const:`UUID_POOL_SIZE` UUIDs at a time from a single
+        :py:func:`os.urandom` call. The pool is discarded if this
+        process was forked since it was filled so UUIDs are never shared
+        with a child process
 
-        return str(uuid.uuid4()) + ':' + str(data_type_val) + '::' + os.path.basename(str(rocrate_path))
+        :return: UUID
+        :rtype: str
+        """
+        if self._uuid_pool_pid != os.getpid():
+            self._uuid_pool = deque()
+            self._uuid_pool_pid = os.getpid()
+        try:
+            return self._uuid_pool.popleft()
+        except IndexError:
+            raw = os.urandom(16 * ProvenanceUtil.UUID_POOL_SIZE)
+            self._uuid_pool.extend(str(uuid.UUID(bytes=raw[i:i + 16], version=4))
+                                   for i in range(0, len(raw), 16))
+            return self._uuid_pool.popleft()
 
     @staticmethod
     def example_dataset_provenance(requiredonly=True, with_ids=False):
@@ -334,10 +578,54 @@ class ProvenanceUtil(object):
             rocrate_file = os.path.join(rocrate_path, constants.RO_CRATE_METADATA_FILE)
         else:
             rocrate_file = rocrate_path
+        return self._read_rocrate_file(rocrate_file)
+
+    def get_rocrate_as_dict_from_fileobj(self, fileobj, name=None):
+        """
+        Loads `RO-Crate <https://www.researchobject.org/ro-crate/>`__ as a dict
+        from a binary file-like object, such as one returned by
+        :py:meth:`tarfile.TarFile.extractfile`
+
+        :param fileobj: binary file-like object with ro-crate meta data
+        :type fileobj: io.BufferedIOBase
+        :param name: Name of source of **fileobj** used in error messages
+        :type name: str
+        :raises CellMapsProvenanceError: If **fileobj** is ``None`` or
+                                         if **raise_on_error** passed
+                                         into constructor is ``True`` and
+                                         there is an issue parsing the
+                                         ro-crate meta data
+        :return: `RO-Crate <https://www.researchobject.org/ro-crate/>`__
+        :rtype: dict
+        """
+        if fileobj is None:
+            raise CellMapsProvenanceError('fileobj is None')
+        return self._read_rocrate_file(name, fileobj=fileobj)
 
+    def _read_rocrate_file(self, rocrate_file, fileobj=None):
+        """
+        Parses `RO-Crate <https://www.researchobject.org/ro-crate/>`__
+        meta data file
+
+        :param rocrate_file: path to ro-crate meta data file
+        :type rocrate_file: str
+        :param fileobj: If set, meta data is read from this binary
+                        file-like object instead of opening
+                        **rocrate_file**, which is then only used
+                        in error messages
+        :type fileobj: io.BufferedIOBase
+        :raises CellMapsProvenanceError: If **raise_on_error** passed
+                                         into constructor is ``True`` and
+                                         there is an issue parsing the
+                                         ro-crate meta data file
+        :return: `RO-Crate <https://www.researchobject.org/ro-crate/>`__
+        :rtype: dict
+        """
         try:
-            with open(rocrate_file, 'r') as f:
-                data = json.load(f)
+            if fileobj is not None:
+                return _json_loads(fileobj.read())
+            with open(rocrate_file, 'rb') as f:
+                data = _json_loads(f.read())
             return data
         except Exception as e:
             if self._raise_on_error:
@@ -360,9 +648,95 @@ class ProvenanceUtil(object):
         if isinstance(rocrate, dict):
             data = rocrate
         else:
-            data = self.get_rocrate_as_dict(rocrate)
+            rocrate_id = self._stream_id_of_rocrate(rocrate)
+            if rocrate_id is not None:
+                return rocrate_id
+            data = self._load_crate(rocrate)
         return data['@id']
 
+    def _load_crate(self, rocrate_path):
+        """
+        Gets `RO-Crate <https://www.researchobject.org/ro-crate/>`__ as a dict
+        like :py:meth:`get_rocrate_as_dict` caching the result, keyed by
+        absolute path, until the modification time or size of the ro-crate
+        meta data file changes. At most :py:const:`CRATE_CACHE_SIZE`
+        crates are kept, evicting the least recently used.
+
+        The :py:class:`dict` returned is shared by subsequent calls and
+        must NOT be modified or handed to callers outside this class.
+        Public methods reading from it copy any mutable values they
+        return, such as *keywords*
+
+        :param rocrate_path: Directory containing `ro-crate-metadata.json` file or
+                             path to file assumed to be ro-crate meta data file
+        :type rocrate_path: str
+        :return: `RO-Crate <https://www.researchobject.org/ro-crate/>`__
+        :rtype: dict
+        """
+        try:
+            st = os.stat(rocrate_path)
+            if stat.S_ISDIR(st.st_mode):
+                rocrate_file = os.path.join(rocrate_path, constants.RO_CRATE_METADATA_FILE)
+                st = os.stat(rocrate_file)
+            else:
+                rocrate_file = rocrate_path
+        except (OSError, TypeError):
+            return self.get_rocrate_as_dict(rocrate_path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        cache_key = os.path.abspath(rocrate_file)
+        with self._crate_cache_lock:
+            cached = self._crate_cache.pop(cache_key, None)
+            if cached is not None and cached[0] == stamp:
+                # reinsert so least recently used crates are evicted first
+                self._crate_cache[cache_key] = cached
+                return cached[1]
+        data = self._read_rocrate_file(rocrate_file)
+        with self._crate_cache_lock:
+            if len(self._crate_cache) >= ProvenanceUtil.CRATE_CACHE_SIZE:
+                del self._crate_cache[next(iter(self._crate_cache))]
+            self._crate_cache[cache_key] = (stamp, data)
+        return data
+
+    def clear_cache(self):
+        """
+        Clears cache of parsed `RO-Crates <https://www.researchobject.org/ro-crate/>`__
+        used by :py:meth:`get_id_of_rocrate` and
+        :py:meth:`get_rocrate_provenance_attributes`
+        """
+        with self._crate_cache_lock:
+            self._crate_cache.clear()
+
+    @staticmethod
+    def _stream_id_of_rocrate(rocrate_path):
+        """
+        Gets top level ``@id`` from `RO-Crate <https://www.researchobject.org/ro-crate/>`__
+        meta data file by streaming it with
+        `ijson <https://pypi.org/project/ijson>`__ so parsing stops
+        once the ``@id`` is found instead of loading the whole file
+
+        :param rocrate_path: Directory containing `ro-crate-metadata.json` file or
+                             path to file assumed to be ro-crate meta data file
+        :type rocrate_path: str
+        :return: ``@id`` or ``None`` if ijson is not available or the ``@id``
+                 could not be obtained
+        :rtype: str
+        """
+        if ijson is None or rocrate_path is None:
+            return None
+        if os.path.isdir(rocrate_path):
+            rocrate_file = os.path.join(rocrate_path, constants.RO_CRATE_METADATA_FILE)
+        else:
+            rocrate_file = rocrate_path
+        try:
+            with open(rocrate_file, 'rb') as f:
+                for prefix, event, value in ijson.parse(f):
+                    if prefix == '@id' and event == 'string':
+                        return value
+        except Exception as e:
+            logger.debug('Unable to stream @id from ' + str(rocrate_file) +
+                         ' : ' + str(e))
+        return None
+
     def get_name_project_org_of_rocrate(self, rocrate):
         """
         Gets name, project, and organization name of `RO-Crate <https://www.researchobject.org/ro-crate/>`__
@@ -387,29 +761,27 @@ class ProvenanceUtil(object):
                 path to file assumed to be `RO-Crate <https://www.researchobject.org/ro-crate/>`__ metadata
                 file
         :type rocrate: str or dict
-        :return:
+        :return: attributes with any values missing from
+                 **rocrate** set to ``None``
         :rtype: :py:class:`~cellmaps_utils.provenance.ROCrateProvenanceAttributes`
         """
         if isinstance(rocrate, dict):
             data = rocrate
         else:
-            data = self.get_rocrate_as_dict(rocrate)
-
-        name = data['name']
-        description = data['description']
-        keywords = data['keywords']
-        org_name = None
-        proj_name = None
-        for entry in data['isPartOf']:
-            if '@type' in entry:
-                if entry['@type'] == 'Organization':
-                    org_name = entry['name']
-                elif entry['@type'] == 'Project':
-                    proj_name = entry['name']
-
-        return ROCrateProvenanceAttributes(name=name, project_name=proj_name,
-                                           organization_name=org_name,
-                                           description=description,
+            data = self._load_crate(rocrate)
+
+        parts = {entry['@type']: entry.get('name')
+                 for entry in data.get('isPartOf', ()) if '@type' in entry}
+
+        # copy so callers editing keywords do not alter cached crate
+        keywords = data.get('keywords')
+        if keywords is not None:
+            keywords = list(keywords)
+
+        return ROCrateProvenanceAttributes(name=data.get('name'),
+                                           project_name=parts.get('Project'),
+                                           organization_name=parts.get('Organization'),
+                                           description=data.get('description'),
                                            keywords=keywords)
 
     def get_merged_rocrate_provenance_attrs(self, rocrate=None,
@@ -467,7 +839,7 @@ class ProvenanceUtil(object):
         name_set = set()
         proj_set = set()
         org_set = set()
-        keyword_set_dict = {}
+        keyword_columns = []
         new_keywords = []
 
         if rocrate is None:
@@ -482,60 +854,71 @@ class ProvenanceUtil(object):
         else:
             raise CellMapsProvenanceError('rocrate must be type str, list or dict, received: ' + str(type(rocrate)))
 
-        for entry in rocrate_list:
-            prov_attrs = self.get_rocrate_provenance_attributes(entry)
-
-            if prov_attrs.get_name() is not None:
-                name_set.add(prov_attrs.get_name())
+        if len(rocrate_list) > ProvenanceUtil.PARALLEL_CRATE_THRESHOLD:
+            # overlap reads of crates from disk
+            with ThreadPoolExecutor(max_workers=min(32, len(rocrate_list))) as executor:
+                prov_attrs_list = list(executor.map(self.get_rocrate_provenance_attributes,
+                                                    rocrate_list))
+        else:
+            prov_attrs_list = [self.get_rocrate_provenance_attributes(entry)
+                               for entry in rocrate_list]
+
+        for prov_attrs in prov_attrs_list:
+            name = prov_attrs.get_name()
+            project_name = prov_attrs.get_project_name()
+            organization_name = prov_attrs.get_organization_name()
+            if name is not None:
+                name_set.add(_intern(name))
             else:
                 logger.error(f'The name for RO-Crate {str(rocrate)} is missing from the metadata. Please '
                              f'provide a name to uphold FAIR principles. Execution will proceed without the  name.')
-            if prov_attrs.get_project_name() is not None:
-                proj_set.add(prov_attrs.get_project_name())
+            if project_name is not None:
+                proj_set.add(_intern(project_name))
             else:
                 logger.error(f'The project name for RO-Crate {str(rocrate)} is missing from the metadata. Please '
                              f'provide a name to uphold FAIR principles. Execution will proceed without the  name.')
-            if prov_attrs.get_organization_name() is not None:
-                org_set.add(prov_attrs.get_organization_name())
+            if organization_name is not None:
+                org_set.add(_intern(organization_name))
             else:
                 logger.error(f'The organization name for RO-Crate {str(rocrate)} is missing from the metadata. Please '
                              f'provide a name to uphold FAIR principles. Execution will proceed without the  name.')
-            if prov_attrs.get_keywords() is not None:
-                for index in range(len(prov_attrs.get_keywords())):
-                    if index not in keyword_set_dict:
-                        keyword_set_dict[index] = set()
-                    if prov_attrs.get_keywords()[index] is not None:
-                        keyword_set_dict[index].add(prov_attrs.get_keywords()[index])
-        logger.debug('keyword_set_dict: ' + str(keyword_set_dict))
+            # just grab 1st **keywords_to_preserve** elements assuming they are
+            # project, data_release_name, cell line, treatment,
+            # name_of_computation
+            keywords = (prov_attrs.get_keywords() or [])[:keywords_to_preserve]
+            while len(keyword_columns) < len(keywords):
+                keyword_columns.append([])
+            for column, keyword in zip(keyword_columns, keywords):
+                if keyword is not None:
+                    column.append(_intern(keyword))
+        logger.debug('keyword_columns: ' + str(keyword_columns))
 
         if override_name is None:
-            new_name = merged_delimiter.join(sorted(list(name_set)))
+            new_name = merged_delimiter.join(sorted(name_set))
         else:
             new_name = override_name
 
         if override_organization_name is None:
-            new_organization_name = merged_delimiter.join(sorted(list(org_set)))
+            new_organization_name = merged_delimiter.join(sorted(org_set))
         else:
             new_organization_name = override_organization_name
 
         if override_project_name is None:
-            new_project_name = merged_delimiter.join(sorted(list(proj_set)))
+            new_project_name = merged_delimiter.join(sorted(proj_set))
         else:
             new_project_name = override_project_name
 
-        # just grab 1st **keywords_to_preserve** elements assuming they are
-        # project, data_release_name, cell line, treatment,
-        # name_of_computation
-        if keywords_to_preserve is not None and len(keyword_set_dict.keys()) >= keywords_to_preserve:
-            for index in range(keywords_to_preserve):
-                new_keywords.append(merged_delimiter.join(sorted(list(keyword_set_dict[index]))))
-        else:
-            for index in range(len(keyword_set_dict.keys())):
-                new_keywords.append(merged_delimiter.join(sorted(list(keyword_set_dict[index]))))
+        split_keywords = set()
+        for column in keyword_columns:
+            keyword = merged_delimiter.join(sorted(set(column)))
+            new_keywords.append(keyword)
+            if merged_delimiter in keyword:
+                split_keywords.update(keyword.split(merged_delimiter))
+        num_merged_keywords = len(new_keywords)
 
         # add names to keywords
         if name_set is not None and len(name_set) > 0:
-            new_keywords.extend(list(name_set))
+            new_keywords.extend(name_set)
 
         if extra_keywords is not None:
             if isinstance(extra_keywords, str):
@@ -550,11 +933,11 @@ class ProvenanceUtil(object):
 
         new_description = ' '.join(new_keywords)
 
-        split_keywords = set()
-        for keyword in new_keywords:
+        # names and extra keywords may also contain the delimiter
+        for keyword in new_keywords[num_merged_keywords:]:
             if merged_delimiter in keyword:
                 split_keywords.update(keyword.split(merged_delimiter))
-        new_keywords.extend(list(split_keywords))
+        new_keywords.extend(split_keywords)
         return ROCrateProvenanceAttributes(name=new_name, project_name=new_project_name,
                                            organization_name=new_organization_name,
                                            description=new_description,
@@ -591,19 +974,17 @@ class ProvenanceUtil(object):
                         to complete
         :type timeout: float
         """
-        cmd = [self._python, self._binary, 'rocrate', 'init',
-               '--name', name,
-               '--organization-name', organization_name,
-               '--project-name', project_name,
-               '--description', description]
-
-        cmd.extend(self._get_keywords(keywords=keywords))
         if guid is None:
             guid = self._generate_guid(data_type='rocrate',
                                        rocrate_path=rocrate_path)
 
-        cmd.append('--guid')
-        cmd.append(guid)
+        cmd = [self._python, self._binary, 'rocrate', 'init',
+               '--name', name,
+               '--organization-name', organization_name,
+               '--project-name', project_name,
+               '--description', description,
+               *self._get_keywords(keywords=keywords),
+               '--guid', guid]
         try:
             exit_code, out_str, err_str = self._run_cmd(cmd, cwd=rocrate_path,
                                                         timeout=timeout)
@@ -662,37 +1043,31 @@ class ProvenanceUtil(object):
         """
         if date_created is None:
             date_created = date.today().strftime(self._default_date_fmt_str)
+        if guid is None:
+            guid = self._generate_guid(data_type='computation',
+                                       rocrate_path=rocrate_path)
+
         cmd = [self._python, self._binary, 'rocrate', 'register',
                'computation',
                '--name', name,
                '--run-by', run_by,
                '--date-created', date_created,
                '--command', command,
-               '--description', description]
-
-        cmd.extend(self._get_keywords(keywords=keywords))
-
-        if guid is None:
-            guid = self._generate_guid(data_type='computation',
-                                       rocrate_path=rocrate_path)
-
-        cmd.append('--guid')
-        cmd.append(guid)
+               '--description', description,
+               *self._get_keywords(keywords=keywords),
+               '--guid', guid]
 
         if used_software is not None:
             for entry in used_software:
-                cmd.append('--used-software')
-                cmd.append(entry)
+                cmd.extend(['--used-software', entry])
         if used_dataset is not None:
             for entry in used_dataset:
                 if entry is not None:
-                    cmd.append('--used-dataset')
-                    cmd.append(entry)
+                    cmd.extend(['--used-dataset', entry])
 
         if generated is not None:
             for entry in generated:
-                cmd.append('--generated')
-                cmd.append(entry)
+                cmd.extend(['--generated', entry])
         cmd.append(rocrate_path)
         exit_code, out_str, err_str = self._run_cmd(cmd, cwd=rocrate_path,
                                                     timeout=timeout)
@@ -748,6 +1123,10 @@ class ProvenanceUtil(object):
         """
         if date_modified is None:
             date_modified = date.today().strftime(self._default_date_fmt_str)
+        if guid is None:
+            guid = self._generate_guid(data_type='software',
+                                       rocrate_path=rocrate_path)
+
         cmd = [self._python, self._binary, 'rocrate', 'register',
                'software',
                '--name', name,
@@ -756,20 +1135,11 @@ class ProvenanceUtil(object):
                '--version', version,
                '--file-format', file_format,
                '--url', url,
-               '--date-modified', date_modified]
-
-        cmd.extend(self._get_keywords(keywords=keywords))
-
-        if guid is None:
-            guid = self._generate_guid(data_type='software',
-                                       rocrate_path=rocrate_path)
-
-        cmd.append('--guid')
-        cmd.append(guid)
-
-        cmd.append('--filepath')
-        cmd.append(url)
-        cmd.append(rocrate_path)
+               '--date-modified', date_modified,
+               *self._get_keywords(keywords=keywords),
+               '--guid', guid,
+               '--filepath', url,
+               rocrate_path]
         exit_code, out_str, err_str = self._run_cmd(cmd, cwd=rocrate_path,
                                                     timeout=timeout)
 
@@ -856,18 +1226,14 @@ class ProvenanceUtil(object):
             guid = self._generate_guid(data_type='dataset',
                                        rocrate_path=rocrate_path)
 
-        cmd.append('--guid')
-        cmd.append(guid)
+        cmd.extend(['--guid', guid])
 
         if skip_copy is not None and skip_copy is False:
-            cmd.append('--source-filepath')
-            cmd.append(source_file)
-            cmd.append('--destination-filepath')
-            cmd.append(os.path.join(rocrate_path,
-                                    os.path.basename(source_file)))
+            cmd.extend(['--source-filepath', source_file,
+                        '--destination-filepath',
+                        os.path.join(rocrate_path, os.path.basename(source_file))])
         else:
-            cmd.append('--filepath')
-            cmd.append(source_file)
+            cmd.extend(['--filepath', source_file])
 
         cmd.append(rocrate_path)
         exit_code, out_str, err_str = self._run_cmd(cmd, cwd=rocrate_path,
@@ -879,3 +1245,253 @@ class ProvenanceUtil(object):
         logger.debug(operation_name + ' data set out_str: ' + str(out_str))
         logger.debug(operation_name + ' data set err_str: ' + str(err_str))
         return out_str
+
+    def register_datasets(self, rocrate_path, data_dicts=None,
+                          source_files=None, skip_copy=True,
+                          guids=None, timeout=30):
+        """
+        Adds multiple datasets to existing rocrate specified by **rocrate_path**
+        by adding information to ``ro-crate-metadata.json`` file.
+
+        If ``in_process`` was set in the constructor, the datasets are
+        validated and then appended to ``ro-crate-metadata.json`` with a
+        single read and write of that file. Otherwise this falls back to calling
+        :py:meth:`register_dataset` for each dataset.
+
+        :param rocrate_path: Path to directory with registered rocrate
+        :type rocrate_path: str
+        :param data_dicts: Information about each dataset to add. See
+                           :py:meth:`register_dataset` for expected format
+        :type data_dicts: list
+        :param source_files: Path to source file of each dataset
+        :type source_files: list
+        :param skip_copy: If ``True`` skip the copy of source files into
+                          **crate_path**. Use this when source files already
+                          reside in **crate_path**
+        :type skip_copy: bool
+        :param guids: IDs for datasets, if ``None`` ids are generated
+        :type guids: list
+        :param timeout: Time in seconds to wait for registration of each
+                        dataset to complete. Not used if running in process
+        :type timeout: float
+        :raises CellMapsProvenanceError: If length of **source_files** or
+                                         **guids** does not match **data_dicts**
+                                         or if **raise_on_error** passed
+                                         into constructor is ``True`` and
+                                         registration fails
+        :return: ids of datasets from `FAIRSCAPE <https://fairscape.github.io>`__
+        :rtype: list
+        """
+        if data_dicts is None or source_files is None:
+            raise CellMapsProvenanceError('data_dicts and source_files must be set')
+        if len(source_files) != len(data_dicts):
+            raise CellMapsProvenanceError('Number of source_files does not '
+                                          'match number of data_dicts')
+        if guids is None:
+            guids = [None] * len(data_dicts)
+        elif len(guids) != len(data_dicts):
+            raise CellMapsProvenanceError('Number of guids does not '
+                                          'match number of data_dicts')
+
+        items = []
+        for data_dict, source_file, guid in zip(data_dicts, source_files, guids):
+            items.append({'type': 'dataset', 'data_dict': data_dict,
+                          'source_file': source_file, 'skip_copy': skip_copy,
+                          'guid': guid})
+        return self.register_batch(rocrate_path, items, timeout=timeout)
+
+    def register_batch(self, rocrate_path, items, timeout=30):
+        """
+        Registers multiple datasets, software, and computations
+        with existing rocrate specified by **rocrate_path**.
+
+        Each entry in **items** is a :py:class:`dict` with ``type`` set to
+        ``dataset``, ``software``, or ``computation`` and the remaining
+        keys set to keyword arguments of :py:meth:`register_dataset`,
+        :py:meth:`register_software`, or :py:meth:`register_computation`
+        respectively (excluding **rocrate_path** and **timeout**).
+
+        .. code-block::
+
+            [{'type': 'software', 'name': 'mytool', 'author': 'bob smith', ...},
+             {'type': 'dataset', 'data_dict': {...}, 'source_file': '/foo.txt'},
+             {'type': 'computation', 'name': 'mytool run', 'used_software': [...], ...}]
+
+        Entries are only batched if ``in_process`` was set in the
+        constructor. In that case all entries are validated and then
+        appended to ``ro-crate-metadata.json`` with a single read and
+        write of that file. Ids must then be set via ``guid`` for any
+        entry that needs to reference an earlier entry.
+
+        .. note::
+
+            By default (``in_process`` is ``False``) nothing is batched.
+            This method simply calls :py:meth:`register_dataset`,
+            :py:meth:`register_software`, or :py:meth:`register_computation`
+            for each entry, running a separate
+            `FAIRSCAPE <https://github.com/fairscape/fairscape-cli>`__
+            process that reads and writes ``ro-crate-metadata.json`` every time
+
+        :param rocrate_path: Path to directory with registered rocrate
+        :type rocrate_path: str
+        :param items: entries to register. See above for format
+        :type items: list
+        :param timeout: Time in seconds to wait for registration of each
+                        entry to complete. Not used if running in process
+        :type timeout: float
+        :raises CellMapsProvenanceError: If an entry has an invalid ``type``
+                                         or if **raise_on_error** passed
+                                         into constructor is ``True`` and
+                                         registration fails
+        :return: ids of registered entries in same order as **items**
+        :rtype: list
+        """
+        register_methods = {'dataset': self.register_dataset,
+                            'software': self.register_software,
+                            'computation': self.register_computation}
+        bound_items = []
+        for item in items:
+            item_args = dict(item)
+            item_type = item_args.pop('type', None)
+            if item_type not in register_methods:
+                raise CellMapsProvenanceError('Invalid type for batch entry: ' +
+                                              str(item_type))
+            bound_items.append((item_type, item_args))
+
+        if self._fairscape_cli is None:
+            return [register_methods[item_type](rocrate_path, timeout=timeout,
+                                                **item_args)
+                    for item_type, item_args in bound_items]
+
+        from fairscape_cli.models import AppendCrate
+
+        crate_path = pathlib.Path(os.path.abspath(rocrate_path))
+        generators = {'dataset': self._generate_dataset,
+                      'software': self._generate_software,
+                      'computation': self._generate_computation}
+        try:
+            # match paths resolved by fairscape-cli run in rocrate_path
+            with self._working_directory(rocrate_path):
+                elements = [generators[item_type](crate_path, **item_args)
+                            for item_type, item_args in bound_items]
+                AppendCrate(cratePath=crate_path, elements=elements)
+        except Exception as e:
+            if self._raise_on_error:
+                raise CellMapsProvenanceError('Error registering batch: ' + str(e))
+            self._log_fairscape_error(['register_batch', str(rocrate_path)],
+                                      1, e, cwd=rocrate_path)
+            return [None] * len(items)
+        return [element.guid for element in elements]
+
+    @staticmethod
+    def _get_keywords_list(keywords):
+        """
+        Converts **keywords** to list matching values
+        `FAIRSCAPE <https://github.com/fairscape/fairscape-cli>`__
+        receives from flags built by :py:meth:`_get_keywords`
+
+        :param keywords:
+        :type keywords: list or str
+        :return: **keywords** as a list, empty if **keywords** is ``None``
+        :rtype: list
+        """
+        if keywords is None:
+            return []
+        if isinstance(keywords, str):
+            return [keywords]
+        return keywords
+
+    def _generate_dataset(self, crate_path, data_dict=None, source_file=None,
+                          skip_copy=True, guid=None):
+        """
+        Creates `FAIRSCAPE <https://github.com/fairscape/fairscape-cli>`__
+        dataset model from same arguments as :py:meth:`register_dataset`,
+        copying **source_file** into **crate_path** if **skip_copy** is ``False``
+
+        :return: dataset
+        :rtype: :py:class:`fairscape_cli.models.Dataset`
+        """
+        from fairscape_cli.models import GenerateDataset, CopyToROCrate
+
+        if guid is None:
+            guid = self._generate_guid(data_type='dataset',
+                                       rocrate_path=crate_path)
+        if skip_copy is not None and skip_copy is False:
+            filepath = os.path.join(crate_path, os.path.basename(source_file))
+            CopyToROCrate(source_file, filepath)
+        else:
+            filepath = source_file
+
+        return GenerateDataset(guid=guid, url=data_dict.get('url'),
+                               author=data_dict['author'],
+                               description=data_dict['description'],
+                               name=data_dict['name'],
+                               keywords=self._get_keywords_list(data_dict.get('keywords', '')),
+                               datePublished=data_dict['date-published'],
+                               version=data_dict['version'],
+                               associatedPublication=None,
+                               additionalDocumentation=None,
+                               dataFormat=data_dict['data-format'],
+                               schema=data_dict.get('schema'),
+                               derivedFrom=[], usedBy=[],
+                               filepath=filepath, cratePath=crate_path)
+
+    def _generate_software(self, crate_path, name='unknown',
+                           description='Must be at least 10 characters',
+                           author='', version='', file_format='', url='',
+                           date_modified=None, keywords=None, guid=None):
+        """
+        Creates `FAIRSCAPE <https://github.com/fairscape/fairscape-cli>`__
+        software model from same arguments as :py:meth:`register_software`
+
+        :return: software
+        :rtype: :py:class:`fairscape_cli.models.Software`
+        """
+        from fairscape_cli.models import GenerateSoftware
+
+        if keywords is None:
+            keywords = ['']
+        if date_modified is None:
+            date_modified = date.today().strftime(self._default_date_fmt_str)
+        if guid is None:
+            guid = self._generate_guid(data_type='software',
+                                       rocrate_path=crate_path)
+        return GenerateSoftware(guid=guid, name=name, author=author,
+                                version=version, description=description,
+                                keywords=self._get_keywords_list(keywords),
+                                fileFormat=file_format, url=url,
+                                dateModified=date_modified, filepath=url,
+                                usedByComputation=[],
+                                associatedPublication=None,
+                                additionalDocumentation=None,
+                                cratePath=crate_path)
+
+    def _generate_computation(self, crate_path, name='', run_by='', command='',
+                              date_created=None,
+                              description='Must be at least 10 characters',
+                              used_software=None, used_dataset=None, generated=None,
+                              keywords=None, guid=None):
+        """
+        Creates `FAIRSCAPE <https://github.com/fairscape/fairscape-cli>`__
+        computation model from same arguments as :py:meth:`register_computation`
+
+        :return: computation
+        :rtype: :py:class:`fairscape_cli.models.Computation`
+        """
+        from fairscape_cli.models import GenerateComputation
+
+        if keywords is None:
+            keywords = ['']
+        if date_created is None:
+            date_created = date.today().strftime(self._default_date_fmt_str)
+        if guid is None:
+            guid = self._generate_guid(data_type='computation',
+                                       rocrate_path=crate_path)
+        return GenerateComputation(guid=guid, name=name, run_by=run_by,
+                                   command=command, dateCreated=date_created,
+                                   description=description,
+                                   keywords=self._get_keywords_list(keywords),
+                                   usedSoftware=used_software or [],
+                                   usedDataset=[d for d in used_dataset or []
+                                                if d is not None],
+                                   generated=generated or [])
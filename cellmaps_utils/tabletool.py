@@ -1,7 +1,6 @@
 import os
-import tempfile
+import stat
 import tarfile
-import shutil
 from datetime import date
 import logging
 import csv
@@ -43,6 +42,8 @@ class TableFromROCrates(BaseCommandLineTool):
     INTERMEDIATE_ROCRATE = 'Intermediate'
     OTHER_ROCRATE = 'Other'
 
+    TARBALL_SUFFIXES = ('.tar.gz', '.tgz', '.tar')
+
     COLUMNS = [ID_COL, DATE_COL,
                VERSION_COL,
                TYPE_COL,
@@ -94,8 +95,9 @@ class TableFromROCrates(BaseCommandLineTool):
         """
         Looks for cell line in keywords
 
-        :param keywords:
-        :type keywords: list
+        :param keywords: keywords, ideally as a :py:class:`set`
+                         for faster lookups
+        :type keywords: set or list
         :return:
         :rtype: str
         """
@@ -170,9 +172,8 @@ class TableFromROCrates(BaseCommandLineTool):
 
         table_file = os.path.join(self._outdir, 'data.tsv')
         with open(table_file, 'w', newline='') as f:
-            writer = csv.DictWriter(f, delimiter='\t',
-                                    fieldnames=TableFromROCrates.COLUMNS)
-            writer.writeheader()
+            writer = csv.writer(f, delimiter='\t')
+            writer.writerow(TableFromROCrates.COLUMNS)
             for rocrate in self._rocrates:
                 rocrate_dict = self._get_rocrate_as_dict(rocrate)
                 urlfile = os.path.basename(rocrate)
@@ -180,35 +181,38 @@ class TableFromROCrates(BaseCommandLineTool):
                     urlfile += '.tar.gz'
 
                 prov_attrs = self._provenance_utils.get_rocrate_provenance_attributes(rocrate=rocrate_dict)
+                keywords = prov_attrs.get_keywords()
+                keyword_set = set(keywords)
+                org_name = prov_attrs.get_organization_name()
 
-                gen_col_value = self._get_software_url(rocrate_dict=rocrate_dict)
+                software, computation, output_url = self._scan_graph(rocrate_dict=rocrate_dict)
+                gen_col_value = self._get_url_of_software(software)
                 if gen_col_value == 'cellmaps_utils':
-                    gen_col_value = '- ' + prov_attrs.get_organization_name() + ' -'
+                    gen_col_value = '- ' + org_name + ' -'
 
-                output_url = self._get_output_dataset_url(rocrate_dict=rocrate_dict)
-
-                comp_name = self._get_computation_name(rocrate_dict=rocrate_dict)
+                comp_name = self._get_name_of_computation(computation)
                 if comp_name is None:
                     comp_name = prov_attrs.get_name()
 
-                logger.debug(rocrate + ': ' + 'Keywords: ' + str(prov_attrs.get_keywords()))
-                row = {TableFromROCrates.ID_COL: self._provenance_utils.get_id_of_rocrate(rocrate=rocrate_dict),
-                       TableFromROCrates.DATE_COL: self._date,
-                       TableFromROCrates.VERSION_COL: self._version,
-                       TableFromROCrates.TYPE_COL: self._get_rocrate_type(comp_name),
-                       TableFromROCrates.CELL_LINE_COL: self._get_cell_line(prov_attrs.get_keywords()),
-                       TableFromROCrates.TISSUE_COL: self._get_tissue(prov_attrs.get_keywords()),
-                       TableFromROCrates.TREATMENT_COL: self._get_treatment(prov_attrs.get_keywords()),
-                       TableFromROCrates.GENESET_COL: self._get_geneset(prov_attrs.get_keywords()),
-                       TableFromROCrates.COMPUTATION_COL: comp_name,
-                       TableFromROCrates.DESCRIPTION_COL: prov_attrs.get_description(),
-                       TableFromROCrates.KEYWORDS_COL: ','.join(prov_attrs.get_keywords()),
-                       TableFromROCrates.DOWNLOAD_COL: self._get_rocrate_download_link(urlfile),
-                       TableFromROCrates.DOWNLOAD_COL_SIZE: self._get_rocrate_size(rocrate),
-                       TableFromROCrates.GENERATED_COL: gen_col_value,
-                       TableFromROCrates.OUTPUT_COL: output_url,
-                       TableFromROCrates.RESPONSIBLE_COL: prov_attrs.get_organization_name()}
-                writer.writerow(row)
+                logger.debug(rocrate + ': ' + 'Keywords: ' + str(keywords))
+                # values must be in same order as TableFromROCrates.COLUMNS
+                writer.writerow((self._provenance_utils.get_id_of_rocrate(rocrate=rocrate_dict),
+                                 self._date,
+                                 self._version,
+                                 self._get_rocrate_type(comp_name),
+                                 self._get_cell_line(keyword_set),
+                                 self._get_tissue(keyword_set),
+                                 self._get_treatment(keyword_set),
+                                 self._get_geneset(keyword_set),
+                                 gen_col_value,
+                                 comp_name,
+                                 prov_attrs.get_description(),
+                                 ','.join(keywords),
+                                 self._get_rocrate_download_link(urlfile),
+                                 self._get_rocrate_size(rocrate),
+                                 gen_col_value,
+                                 output_url,
+                                 org_name))
 
         return 0
 
@@ -217,13 +221,17 @@ class TableFromROCrates(BaseCommandLineTool):
          Determines the size of the RO-Crate, either directly or by inspecting its tar.gz archive.
 
         :param rocrate_path: The file path to the RO-Crate or its tar.gz archive.
-        :return:
-        """
-        if os.path.isfile(rocrate_path):
-            return str(max(round(os.path.getsize(rocrate_path)/1048576.0), 1))
-        targz_appended = rocrate_path + '.tar.gz'
-        if os.path.isfile(targz_appended):
-            return self._get_rocrate_size(rocrate_path + '.tar.gz')
+        :return: Size in megabytes, rounded with a minimum of 1, or ``?``
+                 if neither **rocrate_path** nor **rocrate_path** with
+                 ``.tar.gz`` appended is a file
+        """
+        for path in (rocrate_path, rocrate_path + '.tar.gz'):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if stat.S_ISREG(st.st_mode):
+                return str(max(round(st.st_size/1048576.0), 1))
         return '?'
 
     def _get_rocrate_download_link(self, urlfile):
@@ -242,50 +250,69 @@ class TableFromROCrates(BaseCommandLineTool):
         :param rocrate_dict: The RO-Crate metadata as a dictionary.
         :return: The URL of the software or its name if generated by cellmaps_utils.
         """
-        for entry in self._get_next_software_from_rocrate_dict(rocrate_dict=rocrate_dict):
-            if entry['name'] == 'cellmaps_utils':
-                return entry['name']
-            # this creates html <a href fragment
-            # return '<a href="' + entry['url'] + '" target="_blank">' + entry['name'] + '</a>'
-            return entry['url']
+        return self._get_url_of_software(self._scan_graph(rocrate_dict=rocrate_dict)[0])
 
-    def _get_next_software_from_rocrate_dict(self, rocrate_dict=None):
+    @staticmethod
+    def _get_url_of_software(entry):
         """
-        Generator that gets next software from **rocrate** dict passed
-        in
+        Gets URL of software **entry** from RO-Crate @graph
 
-        :param rocrate_dict:
-        :type rocrate_dict: dict
-        :return: next software section of RO-CRATE as dictionary
-        :type: dict
+        :param entry: Software section of RO-Crate or ``None``
+        :type entry: dict
+        :return: The URL of the software or its name if generated by
+                 cellmaps_utils. ``None`` if **entry** is ``None``
+        :rtype: str
         """
-        if not '@graph' in rocrate_dict:
-            raise CellMapsError('No @graph, but found: ' + str(rocrate_dict.keys()))
-        for graph_entry in rocrate_dict['@graph']:
-            if 'metadataType' not in graph_entry:
-                continue
-            if 'EVI#Software' in graph_entry['metadataType']:
-                yield graph_entry
+        if entry is None:
+            return None
+        if entry['name'] == 'cellmaps_utils':
+            return entry['name']
+        # this creates html <a href fragment
+        # return '<a href="' + entry['url'] + '" target="_blank">' + entry['name'] + '</a>'
+        return entry['url']
 
-    def _get_next_computation_from_rocrate_dict(self, rocrate_dict=None):
+    def _scan_graph(self, rocrate_dict=None):
         """
-        Generator that gets next software from **rocrate** dict passed
-        in
+        Walks @graph of **rocrate_dict** once to find the first
+        software entry, the first computation entry and the url of
+        the first Dataset named 'Output Dataset'. This is the only
+        place @graph is walked, :py:meth:`_get_software_url`,
+        :py:meth:`_get_computation_name` and
+        :py:meth:`_get_output_dataset_url` use it as well
 
         :param rocrate_dict:
         :type rocrate_dict: dict
-        :return: next software section of RO-CRATE as dictionary
-        :type: dict
+        :raises CellMapsError: If there is no @graph in **rocrate_dict**
+        :return: (software entry, computation entry, output dataset url)
+                 with ``None`` for any item not found
+        :rtype: tuple
         """
-        # Todo refactor this and _get_next_software_from_rocrate_dict because
-        #      they basically do the same thing
         if not '@graph' in rocrate_dict:
             raise CellMapsError('No @graph, but found: ' + str(rocrate_dict.keys()))
+        software = None
+        computation = None
+        output_url = None
+        found_sw = False
+        found_cp = False
+        found_out = False
         for graph_entry in rocrate_dict['@graph']:
-            if 'metadataType' not in graph_entry:
-                continue
-            if 'EVI#Computation' in graph_entry['metadataType']:
-                yield graph_entry
+            metadata_type = graph_entry.get('metadataType')
+            if metadata_type is not None:
+                if not found_sw and 'EVI#Software' in metadata_type:
+                    software = graph_entry
+                    found_sw = True
+                if not found_cp and 'EVI#Computation' in metadata_type:
+                    computation = graph_entry
+                    found_cp = True
+            if not found_out and 'url' in graph_entry \
+                    and graph_entry.get('name') == 'Output Dataset':
+                output_url = graph_entry['url']
+                if output_url is None:
+                    output_url = ''
+                found_out = True
+            if found_sw and found_cp and found_out:
+                break
+        return software, computation, output_url
 
     def _get_computation_name(self, rocrate_dict=None):
         """
@@ -294,46 +321,40 @@ class TableFromROCrates(BaseCommandLineTool):
         :param rocrate_dict: The RO-Crate metadata as a dictionary.
         :return: The name of the computation, or None.
         """
-        for entry in self._get_next_computation_from_rocrate_dict(rocrate_dict=rocrate_dict):
-            if ' computation' in entry['name']:
-                return None
-            return entry['name']
+        return self._get_name_of_computation(self._scan_graph(rocrate_dict=rocrate_dict)[1])
 
-    def _get_next_output_dataset_url(self, rocrate_dict=None,
-                                     name='Output Dataset'):
+    @staticmethod
+    def _get_name_of_computation(entry):
         """
-        Generator that gets url from next Dataset
-        whose name is **name**
+        Gets name of computation **entry** from RO-Crate @graph
 
-        :param rocrate_dict:
-        :return:
+        :param entry: Computation section of RO-Crate or ``None``
+        :type entry: dict
+        :return: The name of the computation, or ``None``
+        :rtype: str
         """
-        if not '@graph' in rocrate_dict:
-            raise CellMapsError('No @graph, but found: ' + str(rocrate_dict.keys()))
-        for graph_entry in rocrate_dict['@graph']:
-            if 'name' not in graph_entry:
-                continue
-            if graph_entry['name'] == name:
-                if 'url' in graph_entry:
-                    yield graph_entry['url']
+        if entry is None or ' computation' in entry['name']:
+            return None
+        return entry['name']
 
     def _get_output_dataset_url(self, rocrate_dict=None):
         """
         Retrieves the URL of the output dataset from the RO-Crate.
 
         :param rocrate_dict: The RO-Crate as a dictionary.
-        :return: The URL of the output dataset or an empty string if not found.
+        :return: The URL of the output dataset, an empty string if its url
+                 is ``None`` or ``None`` if not found.
         """
-        for entry in self._get_next_output_dataset_url(rocrate_dict=rocrate_dict):
-            if entry is None:
-                return ''
-            return entry
+        return self._scan_graph(rocrate_dict=rocrate_dict)[2]
 
     def _get_rocrate_as_dict(self, rocrate=None):
         """
         Gets ro-crate-metadata.json as a dict
         from
-        :param rocrate: Path to directory, ro-crate meta data file, tar file, or tar.gz file
+        :param rocrate: Path to directory, ro-crate meta data file, tar file, or tar.gz file.
+                        For tar files, if a directory with the same name minus the
+                        suffix and containing ro-crate-metadata.json exists,
+                        the metadata is read from that directory instead
         :type rocrate: str
         :return:
         """
@@ -341,8 +362,15 @@ class TableFromROCrates(BaseCommandLineTool):
             return self._provenance_utils.get_rocrate_as_dict(rocrate_path=rocrate)
         if not os.path.isfile(rocrate):
             raise CellMapsError('Invalid rocrate: ' + str(rocrate))
-        if rocrate.endswith('.tar') or rocrate.endswith('.tar.gz') or rocrate.endswith('.tgz'):
-            return self._get_rocrate_as_dict_from_tarball(rocrate=rocrate)
+        for suffix in TableFromROCrates.TARBALL_SUFFIXES:
+            if rocrate.endswith(suffix):
+                # if the crate was also left unpacked next to the
+                # tarball read it from there and skip decompression
+                unpacked_metadata = os.path.join(rocrate[:-len(suffix)],
+                                                 constants.RO_CRATE_METADATA_FILE)
+                if os.path.isfile(unpacked_metadata):
+                    return self._provenance_utils.get_rocrate_as_dict(rocrate_path=unpacked_metadata)
+                return self._get_rocrate_as_dict_from_tarball(rocrate=rocrate)
         return self._provenance_utils.get_rocrate_as_dict(rocrate_path=rocrate)
 
     def _get_rocrate_as_dict_from_tarball(self, rocrate=None):
@@ -352,19 +380,18 @@ class TableFromROCrates(BaseCommandLineTool):
         :param rocrate: Path to the tarball containing the RO-Crate.
         :return: The RO-Crate as a dictionary.
         """
-        with tarfile.open(rocrate) as tar:
+        # stream mode reads members sequentially without building
+        # the full member index. '*' handles .tar as well as .tar.gz
+        with tarfile.open(rocrate, mode='r|*') as tar:
             for ti in tar:
                 split_path = ti.name.split('/')
                 if len(split_path) != 2:
                     continue
                 if split_path[1] == 'ro-crate-metadata.json':
-                    temp_dir = tempfile.mkdtemp()
-                    try:
-                        tar.extract(ti.name, path=temp_dir)
-                        return self._provenance_utils.get_rocrate_as_dict(rocrate_path=os.path.join(temp_dir,
-                                                                                             ti.name))
-                    finally:
-                        shutil.rmtree(temp_dir)
+                    # parse member in memory instead of extracting to disk
+                    with tar.extractfile(ti) as f:
+                        return self._provenance_utils.get_rocrate_as_dict_from_fileobj(f,
+                                                                                       name=rocrate + '/' + ti.name)
 
     @staticmethod
     def add_subparser(subparsers):
@@ -55,6 +55,7 @@ setup(
     ],
     description=desc,
     install_requires=requirements,
+    extras_require={'numba': ['numba']},
     license="MIT license",
     long_description=readme + '\n\n' + history,
     long_description_content_type='text/x-rst',
@@ -71,6 +71,24 @@ class TestHiDeFToHierarchyConverter(unittest.TestCase):
         self.assertEqual(len(interactome.get_nodes()), 6)
         self.assertEqual(len(interactome.get_edges()), 7)
 
+    def test_get_interactome_from_ndex(self):
+        content = (b'[{"CXVersion": "2.0", "hasFragments": false},'
+                   b' {"metaData": [{"name": "nodes", "elementCount": 2},'
+                   b' {"name": "edges", "elementCount": 1}]},'
+                   b' {"nodes": [{"id": 0, "v": {"name": "A"}}, {"id": 1, "v": {"name": "B"}}]},'
+                   b' {"edges": [{"id": 0, "s": 0, "t": 1}]},'
+                   b' {"status": [{"error": "", "success": true}]}]')
+        for use_orjson in [True, False]:
+            with patch('cellmaps_utils.hcx_utils.ndex2.client.Ndex2') as mock_client, \
+                    patch('cellmaps_utils.hcx_utils.orjson',
+                          hcx_utils.orjson if use_orjson else None):
+                mock_client.return_value.get_network_as_cx2_stream.return_value.content = content
+                interactome = hcx_utils.get_interactome('host', 'uuid', None, None, None)
+                mock_client.return_value.get_network_as_cx2_stream.assert_called_once_with('uuid')
+            self.assertEqual(2, len(interactome.get_nodes()))
+            self.assertEqual(1, len(interactome.get_edges()))
+            self.assertEqual(0, interactome.lookup_node_id_by_name('A'))
+
     def test_get_hierarchy(self):
         interactome = hcx_utils.get_interactome(None, None, None, None, self.parent)
         hierarchy = self.converter._get_hierarchy(interactome)
@@ -13,6 +13,7 @@ import cellmaps_utils
 from cellmaps_utils import constants
 from cellmaps_utils.exceptions import CellMapsError
 from cellmaps_utils.iftool import (download_file, download_file_skip_existing, FakeImageDownloader,
+                                   _get_color_from_filename,
                                    MultiProcessImageDownloader, IFImageDataConverter, ImageDownloader)
 
 
@@ -64,6 +65,15 @@ class TestDownloadFile(unittest.TestCase):
         self.assertIsNone(result)
 
 
+class TestGetColorFromFilename(unittest.TestCase):
+
+    def test_get_color_from_filename(self):
+        self.assertEqual('blue', _get_color_from_filename('1_A1_1_blue.jpg'))
+        self.assertEqual('red', _get_color_from_filename('1_A1_1_red.tar.gz'))
+        self.assertEqual('green', _get_color_from_filename('green.jpg'))
+        self.assertEqual('', _get_color_from_filename('1_A1_'))
+
+
 class TestFakeImageDownloader(unittest.TestCase):
     @patch('cellmaps_utils.iftool.download_file')
     @patch('os.path.basename')
@@ -200,13 +210,14 @@ class TestIFImageDataConverter(unittest.TestCase):
         self.assertEqual(self.converter._outdir, expected_dir_name)
 
     @patch('os.path.isdir', side_effect=lambda x: False)
+    @patch('os.mkdir')
     @patch('os.makedirs')
-    def test_create_output_directory_success(self, mock_makedirs, mock_isdir):
+    def test_create_output_directory_success(self, mock_makedirs, mock_mkdir, mock_isdir):
         self.converter._outdir = '/fakepath/test_dir'
         self.converter._create_output_directory()
-        expected_calls = [call('/fakepath/test_dir', mode=0o755)] + \
-                         [call('/fakepath/test_dir/' + color, mode=0o755) for color in constants.COLORS]
-        mock_makedirs.assert_has_calls(expected_calls, any_order=True)
+        mock_makedirs.assert_called_once_with('/fakepath/test_dir', mode=0o755)
+        expected_calls = [call('/fakepath/test_dir/' + color, mode=0o755) for color in constants.COLORS]
+        mock_mkdir.assert_has_calls(expected_calls, any_order=True)
 
     @patch('os.path.isdir', return_value=True)
     def test_create_output_directory_exists_error(self, mock_isdir):
@@ -317,6 +328,8 @@ class TestIFImageDataConverter(unittest.TestCase):
             red_image = os.path.join(temp_dir, constants.RED, '11111111111111111111111111111111111111111111111111111111111111.jpg')
             open(red_image, 'a').close()
             open(os.path.join(temp_dir, constants.BLUE, 'nonimagefile.txt'), 'a').close()
+            # directories are not images
+            os.makedirs(os.path.join(temp_dir, constants.GREEN, 'notimage.jpg'))
 
             self.converter._get_fairscape_id = MagicMock(return_value='someid')
             res = self.converter._register_downloaded_images(description='desc',
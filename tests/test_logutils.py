@@ -4,6 +4,8 @@
 """Tests for `cellmaps_utils.cellmaps_io` package."""
 
 import os
+import json
+import logging
 import argparse
 import shutil
 import tempfile
@@ -71,3 +73,76 @@ format=%(asctime)s %(name)-12s %(levelname)-8s %(message)s""")
 
         finally:
             shutil.rmtree(temp_dir)
+
+    def test_write_task_start_and_finish_json(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            logutils.write_task_start_json(outdir=temp_dir, start_time=10,
+                                           data={'someparam': 'value'},
+                                           version='1.0.0')
+            start_file = os.path.join(temp_dir, 'task_10_start.json')
+            with open(start_file, 'r') as f:
+                task = json.load(f)
+            self.assertEqual(10, task['start_time'])
+            self.assertEqual('1.0.0', task['version'])
+            self.assertEqual(temp_dir, task['outdir'])
+            self.assertEqual('value', task['someparam'])
+            for key in ['pid', 'login', 'cwd', 'platform',
+                        'python', 'system', 'uname']:
+                self.assertTrue(key in task, msg=key)
+
+            logutils.write_task_finish_json(outdir=temp_dir, start_time=10,
+                                            end_time=25, status=0)
+            finish_file = os.path.join(temp_dir, 'task_10_finish.json')
+            with open(finish_file, 'r') as f:
+                task = json.load(f)
+            self.assertEqual({'end_time': 25, 'elapsed_time': 15,
+                              'status': '0'}, task)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_write_task_start_json_non_orjson_data(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            # int keys are only supported by the json module
+            logutils.write_task_start_json(outdir=temp_dir, start_time=10,
+                                           data={'someparam': {1: 'one'}})
+            with open(os.path.join(temp_dir, 'task_10_start.json'), 'r') as f:
+                task = json.load(f)
+            self.assertEqual({'1': 'one'}, task['someparam'])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_setup_filelogger(self):
+        temp_dir = tempfile.mkdtemp()
+        root_logger = logging.getLogger()
+        orig_handlers = root_logger.handlers[:]
+        orig_level = root_logger.level
+        try:
+            logutils.setup_filelogger(outdir=temp_dir, handlerprefix=None)
+            # calling twice should not add duplicate handlers
+            logutils.setup_filelogger(outdir=temp_dir)
+            self.assertEqual(['cellmaps_file_handler',
+                              'cellmaps_error_file_handler'],
+                             [h.get_name() for h in root_logger.handlers])
+            test_logger = logging.getLogger('cellmaps_utils.testlogger')
+            test_logger.debug('debug message')
+            test_logger.error('error message')
+            for h in root_logger.handlers:
+                h.flush()
+            with open(os.path.join(temp_dir, 'output.log'), 'r') as f:
+                output = f.read()
+            self.assertTrue('debug message' in output)
+            self.assertTrue('error message' in output)
+            with open(os.path.join(temp_dir, 'error.log'), 'r') as f:
+                output = f.read()
+            self.assertFalse('debug message' in output)
+            self.assertTrue('error message' in output)
+        finally:
+            for h in root_logger.handlers[:]:
+                root_logger.removeHandler(h)
+                h.close()
+            for h in orig_handlers:
+                root_logger.addHandler(h)
+            root_logger.setLevel(orig_level)
+            shutil.rmtree(temp_dir)
@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `cellmaps_utils.music_utils` module."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+from scipy.spatial.distance import canberra
+from sklearn.metrics.pairwise import (cosine_similarity, manhattan_distances,
+                                      euclidean_distances)
+
+from cellmaps_utils import music_utils
+
+
+class TestMusicUtils(unittest.TestCase):
+    """Tests for `cellmaps_utils.music_utils` module."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self._df = pd.DataFrame([[1.0, 2.0, 0.0],
+                                 [0.5, 0.0, 3.0],
+                                 [4.0, 1.0, 1.0],
+                                 [0.0, 0.0, 2.0]],
+                                index=['A', 'B', 'C', 'D'],
+                                columns=['x', 'y', 'z'])
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+
+    def test_canberra_similarity(self):
+        index = self._df.index.values
+        dist = np.zeros((len(index), len(index)))
+        for i in range(len(index)):
+            for j in range(len(index)):
+                dist[i, j] = canberra(self._df.iloc[i].values,
+                                      self._df.iloc[j].values)
+        expected = dist.max() - dist
+        expected /= expected.max()
+
+        res = music_utils.canberra_similarity(self._df)
+        self.assertEqual(list(index), list(res.index))
+        self.assertEqual(list(index), list(res.columns))
+        self.assertTrue(np.allclose(expected, res.values))
+        self.assertTrue(np.allclose(np.diag(res.values), 1.0))
+
+    def test_canberra_similarity_fallback_matches_numba(self):
+        rng = np.random.default_rng(2)
+        df = pd.DataFrame(rng.random((7, 5)))
+        df.iloc[0, 1] = 0.0
+        df.iloc[3, 1] = 0.0
+        df.iloc[2, 4] = -1.5
+        with patch('cellmaps_utils.music_utils._use_numba_canberra',
+                   return_value=False):
+            fallback = music_utils.canberra_similarity(df)
+        if music_utils.njit is None:
+            self.skipTest('numba not available')
+        with patch('cellmaps_utils.music_utils._use_numba_canberra',
+                   return_value=True):
+            res = music_utils.canberra_similarity(df)
+        self.assertTrue(np.allclose(fallback.values, res.values))
+
+    def test_use_numba_canberra(self):
+        with patch('cellmaps_utils.music_utils.njit', None):
+            self.assertFalse(music_utils._use_numba_canberra(10 ** 6))
+        if music_utils.njit is None:
+            self.skipTest('numba not available')
+        threshold = music_utils.NUMBA_CANBERRA_MIN_ROWS
+        with patch('cellmaps_utils.music_utils.get_num_threads', return_value=4):
+            self.assertFalse(music_utils._use_numba_canberra(threshold - 1))
+            self.assertTrue(music_utils._use_numba_canberra(threshold))
+        with patch('cellmaps_utils.music_utils.get_num_threads', return_value=1):
+            self.assertFalse(music_utils._use_numba_canberra(threshold))
+
+    def test_znorm(self):
+        res = music_utils.znorm(self._df)
+        for c in self._df.columns:
+            value = self._df[c]
+            expected = (value - value.mean()) / value.std()
+            self.assertTrue(np.allclose(expected.values, res[c].values))
+        self.assertTrue(np.allclose(res.mean(axis=0).values, 0.0))
+        self.assertTrue(np.allclose(res.std(axis=0).values, 1.0))
+
+    def test_cosine_similarity_scaled(self):
+        expected = cosine_similarity(self._df)
+        expected -= expected.min()
+        expected /= expected.max()
+        res = music_utils.cosine_similarity_scaled(self._df)
+        self.assertTrue(np.allclose(expected, res.values))
+        self.assertAlmostEqual(0.0, res.values.min())
+        self.assertAlmostEqual(1.0, res.values.max())
+
+    def test_manhattan_similarity(self):
+        dist = manhattan_distances(self._df)
+        expected = dist.max() - dist
+        expected /= expected.max()
+        res = music_utils.manhattan_similarity(self._df)
+        self.assertEqual(list(self._df.index), list(res.index))
+        self.assertTrue(np.allclose(expected, res.values))
+
+    def test_euclidean_similarity(self):
+        dist = euclidean_distances(self._df)
+        expected = dist.max() - dist
+        expected /= expected.max()
+        res = music_utils.euclidean_similarity(self._df)
+        self.assertEqual(list(self._df.index), list(res.index))
+        self.assertTrue(np.allclose(expected, res.values))
+
+    def test_correlation_scaled(self):
+        for method, func in [('pearson', music_utils.pearson_scaled),
+                             ('spearman', music_utils.spearman_scaled),
+                             ('kendall', music_utils.kendall_scaled)]:
+            expected = self._df.T.corr(method=method)
+            expected -= expected.min().min()
+            expected /= expected.max().max()
+            res = func(self._df)
+            self.assertEqual(list(self._df.index), list(res.index))
+            self.assertEqual(list(self._df.index), list(res.columns))
+            self.assertTrue(np.allclose(expected.values, res.values),
+                            msg=method)
+
+    def test_pearson_scaled_constant_and_missing_values(self):
+        df = self._df.copy()
+        df.loc['D'] = 2.0
+        expected = df.T.corr(method='pearson')
+        expected -= expected.min().min()
+        expected /= expected.max().max()
+        res = music_utils.pearson_scaled(df)
+        self.assertTrue(np.allclose(expected.values, res.values,
+                                    equal_nan=True))
+        self.assertTrue(np.isnan(res.loc['D', 'A']))
+        self.assertFalse(np.isnan(res.loc['A', 'B']))
+
+        df.loc['D', 'x'] = np.nan
+        expected = df.T.corr(method='pearson')
+        expected -= expected.min().min()
+        expected /= expected.max().max()
+        res = music_utils.pearson_scaled(df)
+        self.assertTrue(np.allclose(expected.values, res.values,
+                                    equal_nan=True))
+
+    def test_upper_tri_values(self):
+        sim = music_utils.euclidean_similarity(self._df)
+        expected = sim.values[np.triu_indices(sim.shape[0], k=1)]
+        res = music_utils.upper_tri_values(sim)
+        self.assertEqual(6, len(res))
+        self.assertTrue(np.array_equal(expected, res))
+
+    def test_euclidean_similarity_float32(self):
+        df = self._df.astype(np.float32)
+        dist = euclidean_distances(self._df)
+        expected = dist.max() - dist
+        expected /= expected.max()
+        res = music_utils.euclidean_similarity(df)
+        self.assertEqual(np.float32, res.values.dtype)
+        self.assertTrue(np.allclose(expected, res.values, atol=1e-5))
+
+    def test_znorm_constant_column(self):
+        df = self._df.copy()
+        df['y'] = 3.0
+        df.loc['A', 'x'] = np.nan
+        res = music_utils.znorm(df)
+        self.assertTrue(np.allclose(res['y'].values, 0.0))
+        value = df['x']
+        expected = (value - value.mean()) / value.std()
+        self.assertTrue(np.allclose(expected.values, res['x'].values,
+                                    equal_nan=True))
+        self.assertTrue(np.isnan(res.loc['A', 'x']))
+
+    def test_save_and_load_obj(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            obj = {'df': self._df, 'arr': np.arange(10), 'val': 'hi'}
+            for method in ['pickle', 'dill']:
+                fname = os.path.join(temp_dir, method + '.obj')
+                music_utils.save_obj(obj, fname, method=method)
+                res = music_utils.load_obj(fname, method=method)
+                self.assertTrue(res['df'].equals(self._df))
+                self.assertTrue(np.array_equal(obj['arr'], res['arr']))
+                self.assertEqual('hi', res['val'])
+
+            fname = os.path.join(temp_dir, 'foo.obj')
+            try:
+                music_utils.save_obj(obj, fname, method='foo')
+                self.fail('Expected ValueError')
+            except ValueError as ve:
+                self.assertTrue('Please select method' in str(ve))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_jaccard(self):
+        self.assertEqual(0.0, music_utils.jaccard(set(), set()))
+        self.assertEqual(0.0, music_utils.jaccard({'a'}, set()))
+        self.assertEqual(0.0, music_utils.jaccard(set(), {'a'}))
+        self.assertEqual(0.0, music_utils.jaccard({'a'}, {'b'}))
+        self.assertEqual(1.0, music_utils.jaccard({'a', 'b'}, {'a', 'b'}))
+        self.assertEqual(0.25, music_utils.jaccard({'a', 'b', 'c'}, {'c', 'd'}))
+        self.assertEqual(0.25, music_utils.jaccard({'c', 'd'}, {'a', 'b', 'c'}))
+
+    def test_upper_tri_values_reuses_mask(self):
+        sim = music_utils.euclidean_similarity(self._df)
+        music_utils.upper_tri_values(sim)
+        hits = music_utils._upper_tri_mask.cache_info().hits
+        res = music_utils.upper_tri_values(sim * 2)
+        self.assertEqual(hits + 1, music_utils._upper_tri_mask.cache_info().hits)
+        self.assertTrue(np.allclose(res, 2 * music_utils.upper_tri_values(sim)))
+
+    def test_check_symmetric(self):
+        sim = music_utils.euclidean_similarity(self._df).to_numpy(copy=True)
+        self.assertTrue(music_utils.check_symmetric(sim))
+        self.assertTrue(music_utils.check_symmetric(sim, block_size=3))
+        self.assertTrue(music_utils.check_symmetric(sim, sample_size=10))
+        self.assertFalse(music_utils.check_symmetric(self._df.values))
+
+        sim[3, 1] += 0.5
+        self.assertFalse(music_utils.check_symmetric(sim))
+        self.assertFalse(music_utils.check_symmetric(sim, block_size=3))
+        self.assertFalse(music_utils.check_symmetric(sim, block_size=1))
+
+        # within tolerance
+        sim[3, 1] = sim[1, 3] + 1e-9
+        self.assertTrue(music_utils.check_symmetric(sim))
+
+        sim[1, 3] = np.nan
+        self.assertFalse(music_utils.check_symmetric(sim))
+
+    def test_check_symmetric_matches_allclose(self):
+        rng = np.random.default_rng(1)
+        for _ in range(50):
+            a = rng.random((6, 6))
+            a = a + a.T
+            a[rng.integers(0, 6), rng.integers(0, 6)] *= 1 + rng.choice([0, 1e-6, 1e-4])
+            self.assertEqual(np.allclose(a, a.T),
+                             music_utils.check_symmetric(a, block_size=4))
+
+    def test_similarity_functions_accept_ndarray(self):
+        for func in [music_utils.cosine_similarity_scaled,
+                     music_utils.manhattan_similarity,
+                     music_utils.euclidean_similarity,
+                     music_utils.canberra_similarity,
+                     music_utils.pearson_scaled,
+                     music_utils.spearman_scaled,
+                     music_utils.kendall_scaled]:
+            arr = self._df.to_numpy(copy=True)
+            res = func(arr)
+            self.assertTrue(isinstance(res, np.ndarray), msg=func.__name__)
+            expected = func(self._df)
+            self.assertTrue(isinstance(expected, pd.DataFrame), msg=func.__name__)
+            self.assertTrue(expected.index.equals(self._df.index))
+            self.assertTrue(expected.columns.equals(self._df.index))
+            self.assertTrue(np.allclose(expected.values, res), msg=func.__name__)
+            # input should not be modified
+            self.assertTrue(np.array_equal(self._df.values, arr), msg=func.__name__)
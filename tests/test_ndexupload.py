@@ -1,13 +1,31 @@
 import os
+import json
+import uuid
+import shutil
+import tempfile
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch, call
 
-from ndex2.cx2 import CX2Network
+from requests.exceptions import ConnectionError as RequestsConnectionError
+
+from ndex2.cx2 import CX2Network, RawCX2NetworkFactory
 
 from cellmaps_utils.exceptions import CellMapsError
+from cellmaps_utils import ndexupload
 from cellmaps_utils.ndexupload import NDExHierarchyUploader
 
 
+def get_uploaded_networks(mock_ndex_client):
+    """
+    Gets CX2 networks passed to save_new_cx2_network or, if networks
+    were encoded with orjson, streamed to save_cx2_stream_as_new_network
+    """
+    stream_calls = mock_ndex_client.save_cx2_stream_as_new_network.call_args_list
+    if len(stream_calls) > 0:
+        return [json.loads(c[0][0].getvalue()) for c in stream_calls]
+    return [c[0][0] for c in mock_ndex_client.save_new_cx2_network.call_args_list]
+
+
 class TestHierarchyToHiDeFConverter(unittest.TestCase):
     def test_password_in_file(self):
         path = os.path.join(os.path.dirname(__file__), 'data', 'test_password')
@@ -27,6 +45,13 @@ class TestHierarchyToHiDeFConverter(unittest.TestCase):
         result = myobj._save_network(net)
         self.assertEqual(result, ("uuid12345", 'http://some-url.com/uuid12345'))
 
+    def test_get_cytoscape_url(self):
+        for server in ['ndexbio.org', 'http://ndexbio.org', 'https://ndexbio.org']:
+            myobj = NDExHierarchyUploader(ndexserver=server, ndexuser='user',
+                                          ndexpassword='password')
+            self.assertEqual('https://ndexbio.org/cytoscape/0/networks/uuid12345',
+                             myobj.get_cytoscape_url('https://ndexbio.org/v3/networks/uuid12345'))
+
     def test_save_network_uuid_is_none(self):
         net = MagicMock()
         mock_ndex_client = MagicMock()
@@ -52,6 +77,58 @@ class TestHierarchyToHiDeFConverter(unittest.TestCase):
         except CellMapsError as he:
             self.assertTrue('An error occurred while saving the network to NDEx: ' in str(he))
 
+    @patch('cellmaps_utils.ndexupload.time.sleep')
+    def test_save_network_streams_orjson_payload(self, mock_sleep):
+        if ndexupload.orjson is None:
+            self.skipTest('orjson not available')
+        net = CX2Network()
+        net.add_network_attribute('name', 'mynet')
+        net.add_node(attributes={'name': 'node1', 'score': 0.5})
+        mock_ndex_client = MagicMock()
+        mock_ndex_client.save_cx2_stream_as_new_network.side_effect = [RequestsConnectionError('no connection'),
+                                                                       'http://some-url.com/uuid12345']
+        myobj = NDExHierarchyUploader(ndexserver='server', ndexuser='user', ndexpassword='password')
+        myobj._ndexclient = mock_ndex_client
+        result = myobj._save_network(net, max_retries=2, retry_wait=1)
+        self.assertEqual(('uuid12345', 'http://some-url.com/uuid12345'), result)
+        mock_ndex_client.save_new_cx2_network.assert_not_called()
+        # each attempt gets a full stream of the network
+        self.assertEqual([net.to_cx2(), net.to_cx2()], get_uploaded_networks(mock_ndex_client))
+
+    def test_get_cx2_payload_unsupported_types(self):
+        self.assertIsNone(NDExHierarchyUploader._get_cx2_payload([]))
+        self.assertIsNone(NDExHierarchyUploader._get_cx2_payload([{1: b'x'}]))
+
+    @patch('cellmaps_utils.ndexupload.time.sleep')
+    def test_save_network_retries_with_backoff(self, mock_sleep):
+        net = MagicMock()
+        mock_ndex_client = MagicMock()
+        mock_ndex_client.save_new_cx2_network.side_effect = [RequestsConnectionError('no connection'),
+                                                             RequestsConnectionError('no connection'),
+                                                             'http://some-url.com/uuid12345']
+        myobj = NDExHierarchyUploader(ndexserver='server', ndexuser='user', ndexpassword='password')
+        myobj._ndexclient = mock_ndex_client
+        result = myobj._save_network(net, max_retries=3, retry_wait=1)
+        self.assertEqual(result, ("uuid12345", 'http://some-url.com/uuid12345'))
+        self.assertEqual([call(1), call(2)], mock_sleep.call_args_list)
+        net.to_cx2.assert_called_once()
+        for save_call in mock_ndex_client.save_new_cx2_network.call_args_list:
+            self.assertIs(net.to_cx2.return_value, save_call[0][0])
+
+    @patch('cellmaps_utils.ndexupload.time.sleep')
+    def test_save_network_retries_exhausted(self, mock_sleep):
+        net = MagicMock()
+        mock_ndex_client = MagicMock()
+        mock_ndex_client.save_new_cx2_network.side_effect = RequestsConnectionError('no connection')
+        myobj = NDExHierarchyUploader(ndexserver='server', ndexuser='user', ndexpassword='password')
+        myobj._ndexclient = mock_ndex_client
+        try:
+            myobj._save_network(net, max_retries=2, retry_wait=1)
+            self.fail('Expected exception')
+        except CellMapsError as he:
+            self.assertEqual('2 attempts to save the network failed.', str(he))
+        self.assertEqual(2, mock_ndex_client.save_new_cx2_network.call_count)
+
     def test_update_hcx_annotations(self):
         mock_hierarchy = CX2Network()
         mock_hierarchy._network_attributes = {'HCX::interactionNetworkName': 'mock_name'}
@@ -61,3 +138,162 @@ class TestHierarchyToHiDeFConverter(unittest.TestCase):
 
         self.assertEqual(updated_hierarchy.get_network_attributes()['HCX::interactionNetworkUUID'], interactome_id)
         self.assertFalse('HCX::interactionNetworkName' in updated_hierarchy.get_network_attributes())
+
+    def test_update_hcx_annotations_without_network_name(self):
+        hierarchy = CX2Network()
+        hierarchy.add_network_attribute('name', 'hierarchy')
+        myobj = NDExHierarchyUploader(ndexserver='server', ndexuser='user', ndexpassword='password')
+        updated_hierarchy = myobj._update_hcx_annotations(hierarchy, 'test-uuid')
+        self.assertEqual({'HCX::interactionNetworkUUID': 'test-uuid',
+                          'name': 'hierarchy'},
+                         updated_hierarchy.get_network_attributes())
+
+    def test_update_hcx_annotations_leaves_hierarchy_unchanged(self):
+        hierarchy = CX2Network()
+        hierarchy.add_network_attribute('HCX::interactionNetworkName', 'mock_name')
+        hierarchy.add_network_attribute('name', 'hierarchy')
+        node_id = hierarchy.add_node(attributes={'name': 'node1'})
+        myobj = NDExHierarchyUploader(ndexserver='server', ndexuser='user', ndexpassword='password')
+        updated_hierarchy = myobj._update_hcx_annotations(hierarchy, 'test-uuid')
+
+        self.assertEqual({'HCX::interactionNetworkUUID': 'test-uuid',
+                          'name': 'hierarchy'},
+                         updated_hierarchy.get_network_attributes())
+        self.assertEqual({'HCX::interactionNetworkName': 'mock_name',
+                          'name': 'hierarchy'},
+                         hierarchy.get_network_attributes())
+        self.assertFalse('HCX::interactionNetworkUUID' in
+                         hierarchy.get_attribute_declarations()['networkAttributes'])
+        self.assertEqual('node1', updated_hierarchy.get_node(node_id)['v']['name'])
+
+    def test_update_hcx_annotations_in_cx2(self):
+        hierarchy = CX2Network()
+        hierarchy.add_network_attribute('HCX::interactionNetworkName', 'mock_name')
+        hierarchy.add_network_attribute('name', 'hierarchy')
+        hierarchy.add_node(attributes={'name': 'node1'})
+        myobj = NDExHierarchyUploader(ndexserver='server', ndexuser='user', ndexpassword='password')
+
+        res = myobj._update_hcx_annotations_in_cx2(hierarchy.to_cx2(), 'test-uuid')
+        updated = RawCX2NetworkFactory().get_cx2network(res)
+        self.assertEqual({'HCX::interactionNetworkUUID': 'test-uuid',
+                          'name': 'hierarchy'},
+                         updated.get_network_attributes())
+        self.assertEqual({'HCX::interactionNetworkUUID': {'d': 'string'},
+                          'name': {'d': 'string'}},
+                         updated.get_attribute_declarations()['networkAttributes'])
+        self.assertEqual('node1', updated.get_node(0)['v']['name'])
+        # hierarchy should be unchanged
+        self.assertEqual({'HCX::interactionNetworkName': 'mock_name',
+                          'name': 'hierarchy'},
+                         hierarchy.get_network_attributes())
+        self.assertFalse('HCX::interactionNetworkUUID' in
+                         hierarchy.get_attribute_declarations()['networkAttributes'])
+
+    def test_update_hcx_annotations_in_cx2_without_network_name(self):
+        hierarchy = CX2Network()
+        hierarchy.add_network_attribute('name', 'hierarchy')
+        myobj = NDExHierarchyUploader(ndexserver='server', ndexuser='user', ndexpassword='password')
+        res = myobj._update_hcx_annotations_in_cx2(hierarchy.to_cx2(), 'test-uuid')
+        updated = RawCX2NetworkFactory().get_cx2network(res)
+        self.assertEqual({'HCX::interactionNetworkUUID': 'test-uuid',
+                          'name': 'hierarchy'},
+                         updated.get_network_attributes())
+
+    def test_update_hcx_annotations_in_cx2_no_network_attributes(self):
+        hierarchy = CX2Network()
+        hierarchy.add_node(attributes={'name': 'node1'})
+        myobj = NDExHierarchyUploader(ndexserver='server', ndexuser='user', ndexpassword='password')
+        res = myobj._update_hcx_annotations_in_cx2(hierarchy.to_cx2(), 'test-uuid')
+        updated = RawCX2NetworkFactory().get_cx2network(res)
+        self.assertEqual({'HCX::interactionNetworkUUID': 'test-uuid'},
+                         updated.get_network_attributes())
+        self.assertEqual('node1', updated.get_node(0)['v']['name'])
+        meta_names = [m['name'] for m in res[1]['metaData']]
+        self.assertTrue('networkAttributes' in meta_names)
+
+    def test_save_hierarchy_and_parent_network(self):
+        hierarchy = CX2Network()
+        hierarchy.add_network_attribute('name', 'hierarchy')
+        hierarchy.add_network_attribute('HCX::interactionNetworkName', 'parent')
+        parent = CX2Network()
+        parent.add_network_attribute('name', 'parent')
+        mock_ndex_client = MagicMock()
+        urls = ['http://server/v3/networks/parentuuid',
+                'http://server/v3/networks/hieruuid']
+        mock_ndex_client.save_new_cx2_network.side_effect = urls
+        mock_ndex_client.save_cx2_stream_as_new_network.side_effect = urls
+        myobj = NDExHierarchyUploader(ndexserver='server', ndexuser='user', ndexpassword='password')
+        myobj._ndexclient = mock_ndex_client
+        res = myobj.save_hierarchy_and_parent_network(hierarchy, parent)
+        self.assertEqual(('parentuuid', 'http://server/viewer/networks/parentuuid',
+                          'hieruuid', 'http://server/viewer/networks/hieruuid'), res)
+
+        uploads = get_uploaded_networks(mock_ndex_client)
+        self.assertEqual(parent.to_cx2(), uploads[0])
+        uploaded = RawCX2NetworkFactory().get_cx2network(uploads[1])
+        self.assertEqual({'name': 'hierarchy',
+                          'HCX::interactionNetworkUUID': 'parentuuid'},
+                         uploaded.get_network_attributes())
+
+    def test_save_hierarchy_and_parent_network_with_parent_uuid(self):
+        hierarchy = CX2Network()
+        hierarchy.add_network_attribute('name', 'hierarchy')
+        hierarchy.add_network_attribute('HCX::interactionNetworkName', 'parent')
+        mock_ndex_client = MagicMock()
+        mock_ndex_client.save_new_cx2_network.return_value = 'http://server/v3/networks/hieruuid'
+        mock_ndex_client.save_cx2_stream_as_new_network.return_value = 'http://server/v3/networks/hieruuid'
+        myobj = NDExHierarchyUploader(ndexserver='server', ndexuser='user', ndexpassword='password')
+        myobj._ndexclient = mock_ndex_client
+        parent_uuid = str(uuid.uuid4())
+        res = myobj.save_hierarchy_and_parent_network(hierarchy, parent_uuid)
+        self.assertEqual((parent_uuid, None, 'hieruuid',
+                          'http://server/viewer/networks/hieruuid'), res)
+        uploaded = RawCX2NetworkFactory().get_cx2network(get_uploaded_networks(mock_ndex_client)[-1])
+        self.assertEqual(parent_uuid, uploaded.get_network_attributes()['HCX::interactionNetworkUUID'])
+
+        try:
+            myobj.save_hierarchy_and_parent_network(hierarchy, 'notauuid')
+            self.fail('Expected exception')
+        except CellMapsError as he:
+            self.assertTrue('Invalid UUID format for parent_ppi' in str(he))
+
+    def test_upload_hierarchy_and_parent_network_from_files(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            hierarchy = CX2Network()
+            hierarchy.add_network_attribute('name', 'hierarchy')
+            hierarchy.add_network_attribute('HCX::interactionNetworkName', 'parent')
+            hierarchy.add_node(attributes={'name': 'node1'})
+            parent = CX2Network()
+            parent.add_network_attribute('name', 'parent')
+            parent.add_node(attributes={'name': 'gene1'})
+            hierarchy.write_as_raw_cx2(os.path.join(temp_dir, 'hierarchy.cx2'))
+            parent.write_as_raw_cx2(os.path.join(temp_dir, 'hierarchy_parent.cx2'))
+
+            mock_ndex_client = MagicMock()
+            urls = ['http://server/v3/networks/parentuuid',
+                    'http://server/v3/networks/hieruuid']
+            mock_ndex_client.save_new_cx2_network.side_effect = urls
+            mock_ndex_client.save_cx2_stream_as_new_network.side_effect = urls
+            myobj = NDExHierarchyUploader(ndexserver='server', ndexuser='user', ndexpassword='password')
+            myobj._ndexclient = mock_ndex_client
+            res = myobj.upload_hierarchy_and_parent_network_from_files(hier_dir=temp_dir)
+            self.assertEqual('parentuuid', res[0])
+            self.assertEqual('hieruuid', res[2])
+            uploads = get_uploaded_networks(mock_ndex_client)
+            self.assertEqual(parent.to_cx2(), uploads[0])
+            uploaded = RawCX2NetworkFactory().get_cx2network(uploads[1])
+            self.assertEqual('node1', uploaded.get_node(0)['v']['name'])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_upload_hierarchy_and_parent_network_from_files_missing(self):
+        myobj = NDExHierarchyUploader(ndexserver='server', ndexuser='user', ndexpassword='password')
+        temp_dir = tempfile.mkdtemp()
+        try:
+            myobj.upload_hierarchy_and_parent_network_from_files(hier_dir=temp_dir)
+            self.fail('Expected exception')
+        except CellMapsError as he:
+            self.assertTrue('Hierarchy network file does not exist' in str(he))
+        finally:
+            shutil.rmtree(temp_dir)
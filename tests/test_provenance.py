@@ -3,18 +3,22 @@
 
 """Tests for `cellmaps_utils.cellmaps_io` package."""
 
+import io
 import os
 import subprocess
 import sys
 import shutil
 import tempfile
+import time
 import json
+import uuid
 import unittest
 from unittest import mock
 from unittest.mock import patch, MagicMock
 
 from cellmaps_utils import constants
-from cellmaps_utils.provenance import ProvenanceUtil
+from cellmaps_utils import provenance
+from cellmaps_utils.provenance import ProvenanceUtil, ROCrateProvenanceAttributes
 from cellmaps_utils.exceptions import CellMapsProvenanceError
 
 
@@ -26,7 +30,8 @@ class TestProvenanceUtil(unittest.TestCase):
 
     def tearDown(self):
         """Tear down test fixtures, if any."""
-        log_provenance_file = os.path.join(os.getcwd(), 'provenance_errors.json')
+        log_provenance_file = os.path.join(os.getcwd(),
+                                           constants.PROVENANCE_ERRORS_FILE)
         if os.path.exists(log_provenance_file):
             os.remove(log_provenance_file)
 
@@ -153,7 +158,8 @@ class TestProvenanceUtil(unittest.TestCase):
                                   description=' some 10 character desc')
             crate_file = os.path.join(temp_dir, constants.RO_CRATE_METADATA_FILE)
             self.assertTrue(os.path.isfile(crate_file) or
-                            os.path.exists(os.path.join(temp_dir, 'provenance_errors.json')))
+                            os.path.exists(os.path.join(temp_dir,
+                                                        constants.PROVENANCE_ERRORS_FILE)))
         finally:
             shutil.rmtree(temp_dir)
 
@@ -406,6 +412,51 @@ class TestProvenanceUtil(unittest.TestCase):
         result = prov.get_name_project_org_of_rocrate(mock_data)
         self.assertEqual(('foo', 'proj', 'org'), result)
 
+    def test_rocrate_provenance_attributes(self):
+        prov_attrs = ROCrateProvenanceAttributes()
+        self.assertEqual('Please enter a name', prov_attrs.get_name())
+        self.assertEqual([''], prov_attrs.get_keywords())
+        prov_attrs = ROCrateProvenanceAttributes(name='name',
+                                                 organization_name='org',
+                                                 project_name='proj',
+                                                 description='desc',
+                                                 keywords=['a', 'b'])
+        self.assertEqual('name', prov_attrs.get_name())
+        self.assertEqual('org', prov_attrs.get_organization_name())
+        self.assertEqual('proj', prov_attrs.get_project_name())
+        self.assertEqual('desc', prov_attrs.get_description())
+        self.assertEqual(['a', 'b'], prov_attrs.get_keywords())
+        self.assertFalse(hasattr(prov_attrs, '__dict__'))
+
+    def test_intern(self):
+        self.assertIs(sys.intern('foo'), provenance._intern(''.join(['f', 'oo'])))
+        self.assertEqual(5, provenance._intern(5))
+        self.assertIsNone(provenance._intern(None))
+
+    def test_get_rocrate_provenance_attributes_from_dict(self):
+        prov = ProvenanceUtil()
+        prov_attrs = prov.get_rocrate_provenance_attributes({'name': 'name',
+                                                             'description': 'desc',
+                                                             'keywords': ['a'],
+                                                             'isPartOf': [{'@type': 'Organization',
+                                                                           'name': 'org'},
+                                                                          {'name': 'notype'},
+                                                                          {'@type': 'Project',
+                                                                           'name': 'proj'}]})
+        self.assertEqual('name', prov_attrs.get_name())
+        self.assertEqual('desc', prov_attrs.get_description())
+        self.assertEqual(['a'], prov_attrs.get_keywords())
+        self.assertEqual('org', prov_attrs.get_organization_name())
+        self.assertEqual('proj', prov_attrs.get_project_name())
+
+        # missing values are None
+        prov_attrs = prov.get_rocrate_provenance_attributes({})
+        self.assertIsNone(prov_attrs.get_name())
+        self.assertIsNone(prov_attrs.get_description())
+        self.assertIsNone(prov_attrs.get_keywords())
+        self.assertIsNone(prov_attrs.get_organization_name())
+        self.assertIsNone(prov_attrs.get_project_name())
+
     def test_get_merged_rocrate_provenance_attrs_none_for_rocrate(self):
         prov = ProvenanceUtil(raise_on_error=True)
         try:
@@ -555,6 +606,57 @@ class TestProvenanceUtil(unittest.TestCase):
 
         self.assertEqual(15, len(prov_attrs.get_keywords()))
 
+    def test_get_merged_rocrate_provenance_attrs_many_crates(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            crate_dirs = []
+            for x in range(ProvenanceUtil.PARALLEL_CRATE_THRESHOLD + 2):
+                crate_dir = os.path.join(temp_dir, str(x))
+                os.makedirs(crate_dir)
+                with open(os.path.join(crate_dir,
+                                       constants.RO_CRATE_METADATA_FILE), 'w') as f:
+                    json.dump({'name': 'name' + str(x),
+                               'description': 'desc',
+                               'keywords': ['proj', 'cell' + str(x)],
+                               'isPartOf': [{'@type': 'Organization',
+                                             'name': 'org'},
+                                            {'@type': 'Project',
+                                             'name': 'proj'}]}, f)
+                crate_dirs.append(crate_dir)
+            prov = ProvenanceUtil()
+            prov_attrs = prov.get_merged_rocrate_provenance_attrs(rocrate=crate_dirs)
+            self.assertEqual('|'.join(['name' + str(x) for x in range(len(crate_dirs))]),
+                             prov_attrs.get_name())
+            self.assertEqual('org', prov_attrs.get_organization_name())
+            self.assertEqual('proj', prov_attrs.get_project_name())
+            self.assertEqual(['proj', '|'.join(['cell' + str(x)
+                                                for x in range(len(crate_dirs))])],
+                             prov_attrs.get_keywords()[:2])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_get_merged_rocrate_provenance_attrs_keywords_to_preserve(self):
+        crates = []
+        for x in range(3):
+            crates.append({'name': 'name', 'description': 'desc',
+                           'keywords': ['proj', None if x == 0 else 'cell' + str(x),
+                                        'treat', 'comp' + str(x)],
+                           'isPartOf': [{'@type': 'Organization', 'name': 'org'},
+                                        {'@type': 'Project', 'name': 'proj'}]})
+        prov = ProvenanceUtil()
+        prov_attrs = prov.get_merged_rocrate_provenance_attrs(rocrate=crates,
+                                                              keywords_to_preserve=2)
+        self.assertEqual(['proj', 'cell1|cell2', 'name'],
+                         prov_attrs.get_keywords()[:3])
+        self.assertEqual(['cell1', 'cell2'], sorted(prov_attrs.get_keywords()[3:]))
+        self.assertEqual('proj cell1|cell2 name', prov_attrs.get_description())
+
+        prov_attrs = prov.get_merged_rocrate_provenance_attrs(rocrate=crates,
+                                                              keywords_to_preserve=None)
+        self.assertEqual(['proj', 'cell1|cell2', 'treat', 'comp0|comp1|comp2',
+                          'name'], prov_attrs.get_keywords()[:5])
+        self.assertEqual(10, len(prov_attrs.get_keywords()))
+
     @patch('cellmaps_utils.provenance.subprocess.Popen')
     def test_success_raise_on_error_false(self, mock_popen):
         mock_popen.return_value.communicate.return_value = (b'Success', b'')
@@ -575,14 +677,35 @@ class TestProvenanceUtil(unittest.TestCase):
         self.assertEqual(result[0], 1)
         mock_log_error.assert_called_once()
 
+    @patch('cellmaps_utils.provenance.ProvenanceUtil._kill_process')
     @patch('cellmaps_utils.provenance.subprocess.Popen')
-    def test_timeout(self, mock_popen):
+    def test_timeout(self, mock_popen, mock_kill):
         mock_popen.return_value.communicate.side_effect = subprocess.TimeoutExpired(cmd='fake_cmd', timeout=360)
         mock_popen.return_value.returncode = 1
 
         prov_util = ProvenanceUtil(raise_on_error=True)
         with self.assertRaises(subprocess.TimeoutExpired):
             prov_util._run_cmd(['fake_cmd'])
+        mock_kill.assert_called_once_with(mock_popen.return_value)
+
+    @unittest.skipUnless(os.name == 'posix', 'process groups require POSIX')
+    def test_run_cmd_timeout_kills_child_processes(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            py_file = os.path.join(temp_dir, 'spawn.py')
+            with open(py_file, 'w') as f:
+                f.write('import subprocess, sys, time\n')
+                f.write("subprocess.Popen([sys.executable, '-c', "
+                        "'import time; time.sleep(60)'])\n")
+                f.write('time.sleep(60)\n')
+            p = ProvenanceUtil()
+            start = time.time()
+            exit_code, out, err = p._run_cmd([sys.executable, py_file],
+                                             cwd=temp_dir, timeout=1)
+            self.assertTrue(time.time() - start < 30)
+            self.assertNotEqual(0, exit_code)
+        finally:
+            shutil.rmtree(temp_dir)
 
     @patch('cellmaps_utils.provenance.subprocess.Popen')
     def test_register_computation_failure_raise_on_error_true(self, mock_popen):
@@ -657,7 +780,7 @@ class TestProvenanceUtil(unittest.TestCase):
         mock_err = 'Some error occurred'
 
         temp_dir = tempfile.mkdtemp()
-        log_file = os.path.join(temp_dir, 'provenance_errors.json')
+        log_file = os.path.join(temp_dir, constants.PROVENANCE_ERRORS_FILE)
 
         try:
             prov_util = ProvenanceUtil()
@@ -666,7 +789,7 @@ class TestProvenanceUtil(unittest.TestCase):
             mock_logger.error.assert_called()
 
             with open(log_file, 'r') as file:
-                data = json.load(file)
+                data = [json.loads(line) for line in file]
                 expected_log_entry = {
                     "cmd": mock_cmd,
                     "exit_code": mock_exit_code,
@@ -746,10 +869,413 @@ class TestProvenanceUtil(unittest.TestCase):
                                             'name': ''}]},
                              rocrate_dict)
 
-            with open(os.path.join(rocrate_path, constants.PROVENANCE_ERRORS_FILE)) as f:
-                data = json.load(f)
-                self.assertEqual(5, len(data))
+            data = list(ProvenanceUtil.read_provenance_errors(rocrate_path))
+            self.assertEqual(5, len(data))
         finally:
             import time
             print(os.listdir(os.path.join(temp_dir, 'test_rocrate')))
             shutil.rmtree(temp_dir)
+
+    def test_rocrate_lifecycle_in_process(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            prov = ProvenanceUtil(raise_on_error=True, in_process=True)
+            if prov._fairscape_cli is None:
+                self.skipTest('fairscape_cli module not available')
+            orig_cwd = os.getcwd()
+            with patch('cellmaps_utils.provenance.subprocess.Popen') as mock_popen:
+                prov.register_rocrate(temp_dir, name='some 10 character name',
+                                      guid='12345',
+                                      description='some 10 character desc',
+                                      keywords=['a', 'b'])
+                s_id = prov.register_software(temp_dir, name='name',
+                                              description='must be 10 characters',
+                                              version='0.1.0', file_format='.py',
+                                              author='bob smith',
+                                              url='http://foo.com',
+                                              guid='soft1')
+                src_file = os.path.join(temp_dir, 'xx')
+                with open(src_file, 'w') as f:
+                    f.write('hi')
+                d_id = prov.register_dataset(temp_dir, source_file=src_file,
+                                             skip_copy=True, guid='data1',
+                                             data_dict={'name': 'Name of dataset',
+                                                        'author': 'Author of dataset',
+                                                        'version': '1.0',
+                                                        'date-published': '2023-11-20',
+                                                        'description': 'Description of dataset',
+                                                        'data-format': 'text'})
+                c_id = prov.register_computation(temp_dir, run_by='runby',
+                                                 name='name', command='cmd',
+                                                 description='desc must be 10 chars',
+                                                 used_software=[s_id],
+                                                 generated=[d_id],
+                                                 guid='comp1')
+                mock_popen.assert_not_called()
+
+            self.assertEqual('soft1', s_id)
+            self.assertEqual('data1', d_id)
+            self.assertEqual('comp1', c_id)
+            self.assertEqual(orig_cwd, os.getcwd())
+            crate = prov.get_rocrate_as_dict(temp_dir)
+            self.assertEqual('12345', crate['@id'])
+            self.assertEqual(['a', 'b'], crate['keywords'])
+            self.assertEqual(['soft1', 'data1', 'comp1'],
+                             [e['@id'] for e in crate['@graph']])
+
+            # invalid computation description causes error
+            try:
+                prov.register_computation(temp_dir, run_by='runby',
+                                          name='name', command='cmd',
+                                          description='short')
+                self.fail('Expected exception')
+            except CellMapsProvenanceError as ce:
+                self.assertTrue('Error adding dataset' in str(ce))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_in_process_not_used_with_custom_binary(self):
+        prov = ProvenanceUtil(fairscape_binary='/foo/fairscape-cli',
+                              in_process=True)
+        self.assertIsNone(prov._fairscape_cli)
+
+    def test_get_id_of_rocrate_streaming(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            crate_file = os.path.join(temp_dir, constants.RO_CRATE_METADATA_FILE)
+            with open(crate_file, 'w') as f:
+                json.dump({'name': 'foo',
+                           '@graph': [{'@id': 'dataset1'}],
+                           '@id': 'crate-id'}, f)
+            prov = ProvenanceUtil()
+            self.assertEqual('crate-id', prov.get_id_of_rocrate(temp_dir))
+            self.assertEqual('crate-id', prov.get_id_of_rocrate(crate_file))
+
+            # missing @id and invalid files fall back to full parse
+            with open(crate_file, 'w') as f:
+                json.dump({'name': 'foo'}, f)
+            with self.assertRaises(KeyError):
+                prov.get_id_of_rocrate(temp_dir)
+
+            with open(crate_file, 'w') as f:
+                f.write('{not json')
+            self.assertIsNone(prov.get_id_of_rocrate(temp_dir))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_register_datasets(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            src_files = []
+            data_dicts = []
+            for x in range(3):
+                src_file = os.path.join(temp_dir, 'data' + str(x) + '.txt')
+                with open(src_file, 'w') as f:
+                    f.write('hi')
+                src_files.append(src_file)
+                data_dicts.append({'name': 'Dataset ' + str(x),
+                                   'author': 'Author of dataset',
+                                   'version': '1.0',
+                                   'date-published': '2023-11-20',
+                                   'description': 'Description of dataset',
+                                   'data-format': 'text',
+                                   'keywords': ['k' + str(x)]})
+            for in_process in [True, False]:
+                prov = ProvenanceUtil(raise_on_error=True, in_process=in_process)
+                crate_dir = os.path.join(temp_dir, str(in_process))
+                os.makedirs(crate_dir)
+                prov.register_rocrate(crate_dir, name='some 10 character name',
+                                      description='some 10 character desc')
+                ids = prov.register_datasets(crate_dir, data_dicts=data_dicts,
+                                             source_files=src_files,
+                                             skip_copy=False,
+                                             guids=['d0', 'd1', 'd2'])
+                self.assertEqual(['d0', 'd1', 'd2'], ids)
+                crate = prov.get_rocrate_as_dict(crate_dir)
+                self.assertEqual(['d0', 'd1', 'd2'],
+                                 [e['@id'] for e in crate['@graph']])
+                self.assertEqual(['k1'], crate['@graph'][1]['keywords'])
+                self.assertEqual('file:///data2.txt',
+                                 crate['@graph'][2]['contentUrl'])
+                for x in range(3):
+                    self.assertTrue(os.path.isfile(os.path.join(crate_dir,
+                                                                'data' + str(x) + '.txt')))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_register_batch(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            src_file = os.path.join(temp_dir, 'data.txt')
+            with open(src_file, 'w') as f:
+                f.write('hi')
+            items = [{'type': 'software', 'name': 'mytool',
+                      'description': 'some 10 character desc',
+                      'author': 'bob smith', 'version': '1.0',
+                      'file_format': 'py', 'keywords': ['tool'],
+                      'url': 'https://github.com/foo/mytool',
+                      'guid': 's0'},
+                     {'type': 'dataset',
+                      'data_dict': {'name': 'Dataset',
+                                    'author': 'Author of dataset',
+                                    'version': '1.0',
+                                    'date-published': '2023-11-20',
+                                    'description': 'Description of dataset',
+                                    'data-format': 'text',
+                                    'keywords': 'k0'},
+                      'source_file': src_file, 'skip_copy': False,
+                      'guid': 'd0'},
+                     {'type': 'computation', 'name': 'mytool run',
+                      'run_by': 'bob smith', 'command': 'mytool --foo',
+                      'description': 'some 10 character desc',
+                      'used_software': ['s0'], 'used_dataset': ['d0', None],
+                      'generated': [], 'guid': 'c0'}]
+            for in_process in [True, False]:
+                prov = ProvenanceUtil(raise_on_error=True, in_process=in_process)
+                crate_dir = os.path.join(temp_dir, str(in_process))
+                os.makedirs(crate_dir)
+                prov.register_rocrate(crate_dir, name='some 10 character name',
+                                      description='some 10 character desc')
+                ids = prov.register_batch(crate_dir, items)
+                self.assertEqual(['s0', 'd0', 'c0'], ids)
+                crate = prov.get_rocrate_as_dict(crate_dir)
+                self.assertEqual(['s0', 'd0', 'c0'],
+                                 [e['@id'] for e in crate['@graph']])
+                self.assertEqual(['k0'], crate['@graph'][1]['keywords'])
+                self.assertEqual(['d0'],
+                                 crate['@graph'][2]['usedDataset'])
+                # default keywords match between in process and command paths
+                self.assertEqual([''], crate['@graph'][2]['keywords'])
+                self.assertTrue(os.path.isfile(os.path.join(crate_dir,
+                                                            'data.txt')))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_get_rocrate_as_dict_from_fileobj(self):
+        prov = ProvenanceUtil()
+        self.assertEqual({'@id': 'x'},
+                         prov.get_rocrate_as_dict_from_fileobj(io.BytesIO(b'{"@id": "x"}')))
+        # invalid json returns default unless raise_on_error is set
+        self.assertIsNone(prov.get_rocrate_as_dict_from_fileobj(io.BytesIO(b'{bad'),
+                                                                name='foo')['@id'])
+        prov = ProvenanceUtil(raise_on_error=True)
+        for fileobj in [None, io.BytesIO(b'{bad')]:
+            try:
+                prov.get_rocrate_as_dict_from_fileobj(fileobj, name='foo')
+                self.fail('Expected exception')
+            except CellMapsProvenanceError:
+                pass
+
+    def test_get_keywords_list(self):
+        self.assertEqual([], ProvenanceUtil._get_keywords_list(None))
+        self.assertEqual(['a'], ProvenanceUtil._get_keywords_list('a'))
+        self.assertEqual(['a', 'b'], ProvenanceUtil._get_keywords_list(['a', 'b']))
+
+    def test_register_batch_invalid_type(self):
+        prov = ProvenanceUtil(in_process=True)
+        for item in [{'type': 'foo'}, {'name': 'notype'}]:
+            try:
+                prov.register_batch('/foo', [item])
+                self.fail('Expected exception')
+            except CellMapsProvenanceError as ce:
+                self.assertTrue('Invalid type for batch entry' in str(ce))
+
+    def test_register_datasets_invalid_args(self):
+        prov = ProvenanceUtil(in_process=True)
+        for kwargs in [{'data_dicts': None, 'source_files': []},
+                       {'data_dicts': [{}], 'source_files': []},
+                       {'data_dicts': [{}], 'source_files': ['a'],
+                        'guids': []}]:
+            try:
+                prov.register_datasets('/foo', **kwargs)
+                self.fail('Expected exception')
+            except CellMapsProvenanceError:
+                pass
+
+    def test_register_datasets_in_process_failure(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            prov = ProvenanceUtil(raise_on_error=True, in_process=True)
+            if prov._fairscape_cli is None:
+                self.skipTest('fairscape_cli module not available')
+            # no ro-crate-metadata.json in directory
+            try:
+                prov.register_datasets(temp_dir,
+                                       data_dicts=[{'name': 'Dataset',
+                                                    'author': 'Author of dataset',
+                                                    'version': '1.0',
+                                                    'date-published': '2023-11-20',
+                                                    'description': 'Description of dataset',
+                                                    'data-format': 'text'}],
+                                       source_files=['https://foo.com/x'])
+                self.fail('Expected exception')
+            except CellMapsProvenanceError as ce:
+                self.assertTrue('Error registering batch' in str(ce))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_load_crate_cached_until_file_changes(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            crate_file = os.path.join(temp_dir, constants.RO_CRATE_METADATA_FILE)
+            crate = {'@id': 'id1', 'name': 'foo', 'description': 'desc',
+                     'keywords': ['a'],
+                     'isPartOf': [{'@type': 'Organization', 'name': 'org'},
+                                  {'@type': 'Project', 'name': 'proj'}]}
+            with open(crate_file, 'w') as f:
+                json.dump(crate, f)
+            prov = ProvenanceUtil()
+            with patch.object(prov, '_read_rocrate_file',
+                              wraps=prov._read_rocrate_file) as mock_get:
+                self.assertEqual('foo', prov.get_rocrate_provenance_attributes(temp_dir).get_name())
+                self.assertEqual(('foo', 'proj', 'org'),
+                                 prov.get_name_project_org_of_rocrate(crate_file))
+                self.assertEqual(1, mock_get.call_count)
+
+                crate['name'] = 'updated name'
+                with open(crate_file, 'w') as f:
+                    json.dump(crate, f)
+                self.assertEqual('updated name',
+                                 prov.get_rocrate_provenance_attributes(temp_dir).get_name())
+                self.assertEqual(2, mock_get.call_count)
+
+            # public method still returns a new dict each call
+            self.assertIsNot(prov.get_rocrate_as_dict(temp_dir),
+                             prov.get_rocrate_as_dict(temp_dir))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_get_rocrate_provenance_attributes_keywords_not_shared(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(temp_dir, constants.RO_CRATE_METADATA_FILE), 'w') as f:
+                json.dump({'@id': 'id1', 'name': 'foo', 'keywords': ['a', 'b']}, f)
+            prov = ProvenanceUtil()
+            prov.get_rocrate_provenance_attributes(temp_dir).get_keywords().append('MUT')
+            self.assertEqual(['a', 'b'],
+                             prov.get_rocrate_provenance_attributes(temp_dir).get_keywords())
+            self.assertEqual(['a', 'b'], prov.get_rocrate_as_dict(temp_dir)['keywords'])
+
+            merged = prov.get_merged_rocrate_provenance_attrs(temp_dir)
+            merged.get_keywords().append('MUT')
+            self.assertEqual(merged.get_keywords()[:-1],
+                             prov.get_merged_rocrate_provenance_attrs(temp_dir).get_keywords())
+            self.assertEqual(['a', 'b'],
+                             prov.get_rocrate_provenance_attributes(temp_dir).get_keywords())
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_register_dataset_cmd(self):
+        prov = ProvenanceUtil()
+        with patch.object(prov, '_run_cmd', return_value=(0, 'id', '')) as mock_run:
+            res = prov.register_dataset('/crate', guid='g', skip_copy=False,
+                                        source_file='/src/file.txt',
+                                        data_dict={'name': 'n', 'version': 'v',
+                                                   'data-format': 'f',
+                                                   'description': 'd',
+                                                   'date-published': 'dp',
+                                                   'author': 'a',
+                                                   'keywords': ['k1', 'k2']})
+            self.assertEqual('id', res)
+            self.assertEqual(['rocrate', 'add', 'dataset', '--name', 'n',
+                              '--version', 'v', '--data-format', 'f',
+                              '--description', 'd', '--date-published', 'dp',
+                              '--author', 'a', '--keywords', 'k1',
+                              '--keywords', 'k2', '--guid', 'g',
+                              '--source-filepath', '/src/file.txt',
+                              '--destination-filepath', '/crate/file.txt',
+                              '/crate'], mock_run.call_args[0][0][2:])
+
+    def test_fairscape_binary_resolution(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            prov = ProvenanceUtil()
+            self.assertEqual(os.path.join(os.path.dirname(sys.executable),
+                                          'fairscape-cli'), prov._binary)
+
+            fake_bin = os.path.join(temp_dir, 'fake-fairscape-cli')
+            with open(fake_bin, 'w') as f:
+                f.write('#!/bin/sh\n')
+            os.chmod(fake_bin, 0o755)
+            with patch.dict(os.environ, {'PATH': temp_dir}):
+                prov = ProvenanceUtil(fairscape_binary='fake-fairscape-cli')
+            self.assertEqual(fake_bin, prov._binary)
+
+            # not found anywhere, use path next to python
+            prov = ProvenanceUtil(fairscape_binary='doesnotexist-cli')
+            self.assertEqual(os.path.join(os.path.dirname(sys.executable),
+                                          'doesnotexist-cli'), prov._binary)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_generate_guid(self):
+        prov = ProvenanceUtil()
+        guids = [prov._generate_guid(data_type='dataset',
+                                     rocrate_path='/foo/crate')
+                 for _ in range(ProvenanceUtil.UUID_POOL_SIZE * 2 + 1)]
+        self.assertEqual(len(guids), len(set(guids)))
+        for guid in guids:
+            uuid_str, suffix = guid.split(':', 1)
+            self.assertEqual(':dataset::crate', ':' + suffix)
+            self.assertEqual(4, uuid.UUID(uuid_str).version)
+        self.assertTrue(prov._generate_guid().endswith(':::None'))
+
+    def test_next_uuid_discards_pool_after_fork(self):
+        prov = ProvenanceUtil()
+        prov._next_uuid()
+        pooled = list(prov._uuid_pool)
+        with patch('cellmaps_utils.provenance.os.getpid',
+                   return_value=prov._uuid_pool_pid + 1):
+            self.assertNotIn(prov._next_uuid(), pooled)
+
+    def test_load_crate_lru_and_clear_cache(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            crate_dirs = []
+            for x in range(3):
+                crate_dir = os.path.join(temp_dir, str(x))
+                os.makedirs(crate_dir)
+                with open(os.path.join(crate_dir,
+                                       constants.RO_CRATE_METADATA_FILE), 'w') as f:
+                    json.dump({'@id': 'id' + str(x)}, f)
+                crate_dirs.append(crate_dir)
+            prov = ProvenanceUtil()
+            with patch.object(ProvenanceUtil, 'CRATE_CACHE_SIZE', 2):
+                prov._load_crate(crate_dirs[0])
+                prov._load_crate(crate_dirs[1])
+                # relative path hits same entry and makes 0 most recent
+                rel_path = os.path.relpath(crate_dirs[0])
+                self.assertEqual('id0', prov._load_crate(rel_path)['@id'])
+                self.assertEqual(2, len(prov._crate_cache))
+                prov._load_crate(crate_dirs[2])
+            cached_dirs = [os.path.dirname(k) for k in prov._crate_cache]
+            self.assertEqual([crate_dirs[0], crate_dirs[2]], cached_dirs)
+            prov.clear_cache()
+            self.assertEqual({}, prov._crate_cache)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_log_fairscape_error_appends(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            for use_orjson in [True, False]:
+                log_file = os.path.join(temp_dir, constants.PROVENANCE_ERRORS_FILE)
+                with patch('cellmaps_utils.provenance.orjson',
+                           provenance.orjson if use_orjson else None):
+                    ProvenanceUtil._log_fairscape_error(['cmd1'], 1, 'err1', cwd=temp_dir)
+                    ProvenanceUtil._log_fairscape_error(['cmd2'], 2, 'err2', cwd=temp_dir)
+                    with open(log_file, 'r') as f:
+                        data = [json.loads(line) for line in f]
+                    self.assertEqual([['cmd1'], ['cmd2']], [e['cmd'] for e in data])
+                    self.assertEqual(2, data[1]['exit_code'])
+                    self.assertEqual(data,
+                                     list(ProvenanceUtil.read_provenance_errors(log_file)))
+
+                    crate_file = os.path.join(temp_dir, constants.RO_CRATE_METADATA_FILE)
+                    with open(crate_file, 'w') as f:
+                        json.dump({'@id': 'foo', 'name': 'é'}, f)
+                    self.assertEqual({'@id': 'foo', 'name': 'é'},
+                                     ProvenanceUtil().get_rocrate_as_dict(temp_dir))
+                os.remove(log_file)
+        finally:
+            shutil.rmtree(temp_dir)
@@ -1,9 +1,13 @@
+import json
 import shutil
+import tarfile
+import tempfile
 import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import MagicMock
 import os
 from datetime import date
 from cellmaps_utils.provenance import ProvenanceUtil
+from cellmaps_utils.exceptions import CellMapsError
 from cellmaps_utils.tabletool import TableFromROCrates
 
 
@@ -34,6 +38,16 @@ class TestTableFromROCrates(unittest.TestCase):
         self.assertEqual(self.table_from_rocrates.run(), 0)
         files = os.listdir(self.outdir)
         self.assertEqual(len(files), 1)
+        with open(os.path.join(self.outdir, 'data.tsv'), 'r') as f:
+            header = f.readline().rstrip('\n').split('\t')
+            row = f.readline().rstrip('\n').split('\t')
+        self.assertEqual(TableFromROCrates.COLUMNS, header)
+        self.assertEqual(len(header), len(row))
+        values = dict(zip(header, row))
+        self.assertEqual(self.theargs.date, values[TableFromROCrates.DATE_COL])
+        self.assertEqual('1.0', values[TableFromROCrates.VERSION_COL])
+        self.assertEqual('https://example.com/data/ro-crate-metadata.json.tar.gz',
+                         values[TableFromROCrates.DOWNLOAD_COL])
 
     def test_get_rocrate_type(self):
         self.assertEqual(self.table_from_rocrates._get_rocrate_type('IF images'), TableFromROCrates.DATA_ROCRATE)
@@ -43,22 +57,82 @@ class TestTableFromROCrates(unittest.TestCase):
     def test_get_cell_line(self):
         self.assertEqual(self.table_from_rocrates._get_cell_line(['MDA-MB-468']), 'MDA-MB-468')
         self.assertEqual(self.table_from_rocrates._get_cell_line(['Other']), 'Unknown')
+        self.assertEqual(self.table_from_rocrates._get_cell_line({'KOLF2.1J', 'x'}), 'KOLF2.1J')
 
     def test_get_treatment(self):
         self.assertEqual(self.table_from_rocrates._get_treatment(['untreated', 'vorinostat']), 'untreated,vorinostat')
         self.assertEqual(self.table_from_rocrates._get_treatment(['paclitaxel']), 'paclitaxel')
         self.assertEqual(self.table_from_rocrates._get_treatment(['unknown']), '')
+        # order is fixed even if keywords are a set
+        self.assertEqual(self.table_from_rocrates._get_treatment({'paclitaxel', 'untreated'}),
+                         'untreated,paclitaxel')
 
     def test_get_geneset(self):
         self.assertEqual(self.table_from_rocrates._get_geneset(['chromatin', 'metabolic']), 'chromatin,metabolic')
         self.assertEqual(self.table_from_rocrates._get_geneset(['other']), 'Unknown')
 
-    @patch('os.path.isfile')
-    @patch('os.path.getsize')
-    def test_get_rocrate_size(self, mock_getsize, mock_isfile):
-        mock_isfile.return_value = True
-        mock_getsize.return_value = 1048576
-        self.assertEqual(self.table_from_rocrates._get_rocrate_size('path/to/rocrate'), '1')
+    def test_get_rocrate_size(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            rocrate = os.path.join(temp_dir, 'rocrate')
+            self.assertEqual('?', self.table_from_rocrates._get_rocrate_size(rocrate))
+
+            # directory without tarball
+            os.makedirs(rocrate)
+            self.assertEqual('?', self.table_from_rocrates._get_rocrate_size(rocrate))
+
+            # directory with tarball
+            with open(rocrate + '.tar.gz', 'wb') as f:
+                f.truncate(3 * 1048576)
+            self.assertEqual('3', self.table_from_rocrates._get_rocrate_size(rocrate))
+
+            # small file is reported as 1
+            small_file = os.path.join(temp_dir, 'small.json')
+            with open(small_file, 'w') as f:
+                f.write('{}')
+            self.assertEqual('1', self.table_from_rocrates._get_rocrate_size(small_file))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_get_rocrate_as_dict_from_tarball(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            crate_dir = os.path.join(temp_dir, 'mycrate')
+            os.makedirs(crate_dir)
+            with open(os.path.join(crate_dir, 'ro-crate-metadata.json'), 'w') as f:
+                json.dump(self.rocrate_dict, f)
+            with open(os.path.join(crate_dir, 'other.txt'), 'w') as f:
+                f.write('hi')
+            for suffix, mode in [('.tar.gz', 'w:gz'), ('.tar', 'w')]:
+                tarball = os.path.join(temp_dir, 'archive' + suffix)
+                with tarfile.open(tarball, mode) as tar:
+                    tar.add(crate_dir, arcname='mycrate')
+                self.assertEqual(self.rocrate_dict,
+                                 self.table_from_rocrates._get_rocrate_as_dict(tarball))
+
+            # unpacked crate next to tarball is used instead of tarball
+            tarball = os.path.join(temp_dir, 'mycrate.tar.gz')
+            with tarfile.open(tarball, 'w:gz') as tar:
+                tar.add(crate_dir, arcname='mycrate')
+            unpacked = {'@graph': [], '@id': 'unpacked'}
+            with open(os.path.join(crate_dir, 'ro-crate-metadata.json'), 'w') as f:
+                json.dump(unpacked, f)
+            self.assertEqual(unpacked,
+                             self.table_from_rocrates._get_rocrate_as_dict(tarball))
+            os.remove(os.path.join(crate_dir, 'ro-crate-metadata.json'))
+            self.assertEqual(self.rocrate_dict,
+                             self.table_from_rocrates._get_rocrate_as_dict(tarball))
+
+            # invalid json falls back to default provenance
+            with open(os.path.join(crate_dir, 'ro-crate-metadata.json'), 'w') as f:
+                f.write('{not json')
+            tarball = os.path.join(temp_dir, 'bad.tar.gz')
+            with tarfile.open(tarball, 'w:gz') as tar:
+                tar.add(crate_dir, arcname='mycrate')
+            res = self.table_from_rocrates._get_rocrate_as_dict(tarball)
+            self.assertIsNone(res['@id'])
+        finally:
+            shutil.rmtree(temp_dir)
 
     def test_get_rocrate_download_link(self):
         self.assertEqual(self.table_from_rocrates._get_rocrate_download_link('file.tar.gz'), 'https://example.com/data/file.tar.gz')
@@ -66,27 +140,30 @@ class TestTableFromROCrates(unittest.TestCase):
     def test_get_software_url(self):
         self.assertEqual(self.table_from_rocrates._get_software_url(self.rocrate_dict), 'cellmaps_utils')
 
-    def test_get_next_software_from_rocrate_dict(self):
-        software_generator = self.table_from_rocrates._get_next_software_from_rocrate_dict(self.rocrate_dict)
-        software = next(software_generator)
-        self.assertEqual(software['name'], 'cellmaps_utils')
-
-    def test_get_next_computation_from_rocrate_dict(self):
-        computation_generator = self.table_from_rocrates._get_next_computation_from_rocrate_dict(self.rocrate_dict)
-        computation = next(computation_generator)
-        self.assertEqual(computation['name'], 'Computation X')
-
     def test_get_computation_name(self):
         self.assertEqual(self.table_from_rocrates._get_computation_name(self.rocrate_dict), 'Computation X')
 
-    def test_get_next_output_dataset_url(self):
-        dataset_url_generator = self.table_from_rocrates._get_next_output_dataset_url(self.rocrate_dict)
-        dataset_url = next(dataset_url_generator)
-        self.assertEqual(dataset_url, 'https://example.com/dataset/output')
-
     def test_get_output_dataset_url(self):
         self.assertEqual(self.table_from_rocrates._get_output_dataset_url(self.rocrate_dict), 'https://example.com/dataset/output')
-
+        self.assertEqual('', self.table_from_rocrates._get_output_dataset_url(
+            {'@graph': [{'name': 'Output Dataset', 'url': None}]}))
+        self.assertIsNone(self.table_from_rocrates._get_output_dataset_url({'@graph': []}))
+        self.assertIsNone(self.table_from_rocrates._get_software_url({'@graph': []}))
+        self.assertIsNone(self.table_from_rocrates._get_computation_name({'@graph': []}))
+
+    def test_scan_graph(self):
+        software, computation, output_url = self.table_from_rocrates._scan_graph(self.rocrate_dict)
+        self.assertEqual('cellmaps_utils', software['name'])
+        self.assertEqual('Computation X', computation['name'])
+        self.assertEqual('https://example.com/dataset/output', output_url)
+
+        self.assertEqual((None, None, None),
+                         self.table_from_rocrates._scan_graph({'@graph': [{'name': 'foo'}]}))
+        try:
+            self.table_from_rocrates._scan_graph({})
+            self.fail('Expected CellMapsError')
+        except CellMapsError as ce:
+            self.assertTrue('No @graph' in str(ce))
 
 if __name__ == '__main__':
     unittest.main()